@@ -1,46 +1,98 @@
 # Database connection and setup
 import os
-from motor.motor_asyncio import AsyncIOMotorClient
+from typing import List, Optional
+from mongojet import create_client, Client
+from bson import ObjectId
 from datetime import datetime
 import logging
 
 logger = logging.getLogger(__name__)
 
 class MongoDB:
-    client: AsyncIOMotorClient = None
+    client: Client = None
     database = None
+    collection = None
+    letter_cache = None
 
 mongodb = MongoDB()
 
+LETTER_CACHE_COLLECTION = "letter_cache"
+
+# Connection pool tuning, passed as URI options to the Rust driver
+POOL_OPTIONS = "maxPoolSize=16&minPoolSize=4&maxIdleTimeMS=60000&maxConnecting=4&serverSelectionTimeoutMS=3000&retryWrites=true"
+
+def _with_pool_options(url: str) -> str:
+    """Append pool options to a MongoDB connection string"""
+    if "?" in url:
+        return f"{url}&{POOL_OPTIONS}"
+    # The URI spec requires a "/" between the hosts and the options
+    if "/" not in url.split("://", 1)[-1]:
+        url += "/"
+    return f"{url}?{POOL_OPTIONS}"
+
 async def connect_to_mongo():
     """Create database connection"""
-    mongodb.client = AsyncIOMotorClient(os.getenv("MONGODB_URL"))
-    mongodb.database = mongodb.client[os.getenv("DATABASE_NAME")]
+    # One client per process, created in the FastAPI lifespan and reused by every request
+    mongodb.client = await create_client(_with_pool_options(os.environ["MONGODB_URL"]))
+    mongodb.database = mongodb.client.get_database(os.environ["DATABASE_NAME"])
+    
+    # Establish the connection now so the first request skips the handshake
+    await mongodb.client.admin.run_command({"ping": 1})
+    
+    # Collection handles are fixed for the process lifetime
+    mongodb.collection = mongodb.database[os.environ["COLLECTION_NAME"]]
+    mongodb.letter_cache = mongodb.database[LETTER_CACHE_COLLECTION]
+    
+    # Serve newest-first case listings from an index
+    await mongodb.collection.create_index([("created_at", -1)])
+    
+    # Expire cached letters automatically
+    await mongodb.letter_cache.create_index(
+        "created_at",
+        expireAfterSeconds=int(os.getenv("LETTER_CACHE_TTL_SECONDS", "86400"))
+    )
     logger.info("Connected to MongoDB")
 
 async def close_mongo_connection():
     """Close database connection"""
-    mongodb.client.close()
+    await mongodb.client.close()
     logger.info("Disconnected from MongoDB")
 
 async def save_case(case_data: dict):
-    """Save case to database"""
-    case_data["created_at"] = datetime.utcnow()
-    result = await mongodb.database[os.getenv("COLLECTION_NAME")].insert_one(case_data)
-    return str(result.inserted_id)
-
-async def get_case(case_id: str):
-    """Retrieve case from database"""
-    from bson import ObjectId
-    case = await mongodb.database[os.getenv("COLLECTION_NAME")].find_one({"_id": ObjectId(case_id)})
+    """Save case to database; a preset `_id` and `created_at` are kept"""
+    case_data.setdefault("created_at", datetime.utcnow())
+    # Bumped on every mutation; export caches are keyed on it
+    case_data.setdefault("updated_at", case_data["created_at"])
+    result = await mongodb.collection.insert_one(case_data)
+    return str(result["inserted_id"])
+
+async def get_case(case_id: str, fields: Optional[List[str]] = None):
+    """Retrieve case from database, optionally projected to the given fields"""
+    projection = {field: 1 for field in fields} if fields else None
+    case = await mongodb.collection.find_one({"_id": ObjectId(case_id)}, projection=projection)
     if case:
         case["_id"] = str(case["_id"])
     return case
 
-async def get_all_cases():
-    """Retrieve all cases"""
-    cases = []
-    async for case in mongodb.database[os.getenv("COLLECTION_NAME")].find():
+async def get_all_cases(fields: Optional[List[str]] = None, limit: int = 100, skip: int = 0):
+    """Retrieve cases, newest first, optionally projected to the given fields"""
+    projection = {field: 1 for field in fields} if fields else None
+    cases = await mongodb.collection.find_many(
+        {}, projection=projection, sort={"created_at": -1}, skip=skip, limit=limit, batch_size=500
+    )
+    for case in cases:
         case["_id"] = str(case["_id"])
-        cases.append(case)
     return cases
+
+async def save_cached_letters(entries: list):
+    """Persist letter cache entries"""
+    if not entries:
+        return
+    created_at = datetime.utcnow()
+    for entry in entries:
+        entry["created_at"] = created_at
+    await mongodb.letter_cache.insert_many(entries)
+
+async def get_cached_letters():
+    """Retrieve all unexpired letter cache entries"""
+    return await mongodb.letter_cache.find_many({}, projection={"_id": 0})
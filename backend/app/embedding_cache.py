@@ -0,0 +1,58 @@
+# Persistent content-hash cache for chunk embeddings
+import hashlib
+import os
+import sqlite3
+import numpy as np
+from typing import Dict, List
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Stay below SQLite's bound-parameter limit on older builds
+_QUERY_BATCH = 500
+
+class EmbeddingCache:
+    def __init__(self, path: str, model_id: str):
+        self.model_id = model_id
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings ("
+            "content_hash TEXT NOT NULL, model TEXT NOT NULL, vector BLOB NOT NULL, "
+            "PRIMARY KEY (content_hash, model))"
+        )
+        self.connection.commit()
+
+    @staticmethod
+    def content_hash(text: str) -> str:
+        """SHA-256 of the chunk text"""
+        return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+    def get_many(self, hashes: List[str]) -> Dict[str, np.ndarray]:
+        """Return cached vectors for the given content hashes"""
+        found = {}
+        for start in range(0, len(hashes), _QUERY_BATCH):
+            batch = hashes[start:start + _QUERY_BATCH]
+            placeholders = ",".join("?" * len(batch))
+            rows = self.connection.execute(
+                f"SELECT content_hash, vector FROM embeddings WHERE model = ? AND content_hash IN ({placeholders})",
+                [self.model_id, *batch]
+            )
+            for content_hash, vector in rows:
+                found[content_hash] = np.frombuffer(vector, dtype='float32')
+        return found
+
+    def put_many(self, hashes: List[str], vectors: np.ndarray):
+        """Store vectors under their content hashes"""
+        vectors = np.asarray(vectors, dtype='float32')
+        self.connection.executemany(
+            "INSERT OR REPLACE INTO embeddings (content_hash, model, vector) VALUES (?, ?, ?)",
+            [(content_hash, self.model_id, vector.tobytes()) for content_hash, vector in zip(hashes, vectors)]
+        )
+        self.connection.commit()
+
+    def close(self):
+        """Close the cache database"""
+        self.connection.close()
@@ -0,0 +1,118 @@
+# Semantic cache for generated letters
+import copy
+import hashlib
+import faiss
+import numpy as np
+from typing import Dict, List, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+# Case fields that end up in the generated text; a cached letter is only ever
+# reused for a case with exactly the same values
+IDENTITY_FIELDS = (
+    "client_name", "advocate_name", "law_firm_name",
+    "recipient_name", "recipient_organization"
+)
+
+def identity_key(case_data: Dict) -> str:
+    """Exact partition key over the identity fields of a case"""
+    values = "\x1f".join(str(case_data.get(field) or "") for field in IDENTITY_FIELDS)
+    return hashlib.sha256(values.encode("utf-8")).hexdigest()
+
+class LetterCache:
+    def __init__(self, dimension: int, threshold: float = 0.95):
+        self.dimension = dimension
+        self.threshold = threshold
+        # One index per identity partition; similarity is only compared within a partition.
+        # Cosine similarity == inner product on L2-normalized vectors
+        self.indexes: Dict[str, faiss.IndexFlatIP] = {}
+        self.entries: Dict[str, Dict] = {}
+        self.keys: Dict[str, List[str]] = {}
+        self.unsaved: List[Dict] = []
+        self.hits = 0
+        self.misses = 0
+        self.hit_similarity_sum = 0.0
+        self.min_hit_similarity: Optional[float] = None
+
+    def _normalize(self, embedding) -> np.ndarray:
+        """Return a normalized (1, d) float32 copy of the embedding"""
+        vector = np.array(embedding, dtype='float32').reshape(1, -1)
+        faiss.normalize_L2(vector)
+        return vector
+
+    def _key(self, partition: str, vector: np.ndarray) -> str:
+        """MD5 of the partition and embedding bytes"""
+        return hashlib.md5(partition.encode("utf-8") + vector.tobytes()).hexdigest()
+
+    def lookup(self, embedding, partition: str) -> Optional[Dict]:
+        """Return a copy of the cached result for a semantically equivalent query in the partition"""
+        index = self.indexes.get(partition)
+        if index is not None and index.ntotal > 0:
+            vector = self._normalize(embedding)
+            similarities, indices = index.search(vector, 1)
+            similarity = float(similarities[0][0])
+            if indices[0][0] >= 0 and similarity >= self.threshold:
+                self.hits += 1
+                self.hit_similarity_sum += similarity
+                if self.min_hit_similarity is None or similarity < self.min_hit_similarity:
+                    self.min_hit_similarity = similarity
+                return copy.deepcopy(self.entries[self.keys[partition][indices[0][0]]])
+
+        self.misses += 1
+        return None
+
+    def add(self, embedding, result: Dict, partition: str, persist: bool = True):
+        """Store a generated result under its query embedding and identity partition"""
+        vector = self._normalize(embedding)
+        key = self._key(partition, vector)
+        if key in self.entries:
+            return
+
+        if partition not in self.indexes:
+            self.indexes[partition] = faiss.IndexFlatIP(self.dimension)
+            self.keys[partition] = []
+        self.indexes[partition].add(vector)
+        self.keys[partition].append(key)
+        self.entries[key] = copy.deepcopy(result)
+
+        if persist:
+            self.unsaved.append({
+                "key": key,
+                "partition": partition,
+                "embedding": vector[0].tolist(),
+                "result": self.entries[key]
+            })
+
+    def load(self, entries: List[Dict]):
+        """Load persisted cache entries"""
+        # Entries saved before partitioning carry no identity key and are skipped
+        loaded = 0
+        for entry in entries:
+            if entry.get("partition"):
+                self.add(entry["embedding"], entry["result"], entry["partition"], persist=False)
+                loaded += 1
+        logger.info(f"Loaded {loaded} cached letters")
+
+    def pop_unsaved(self) -> List[Dict]:
+        """Return entries not yet persisted and clear the pending list"""
+        unsaved, self.unsaved = self.unsaved, []
+        return unsaved
+
+    def requeue_unsaved(self, entries: List[Dict]):
+        """Return entries whose save failed to the pending list"""
+        self.unsaved[:0] = entries
+
+    def stats(self) -> Dict:
+        """Cache hit statistics for threshold tuning"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self.entries),
+            "partitions": len(self.indexes),
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "min_hit_similarity": self.min_hit_similarity,
+            "mean_hit_similarity": self.hit_similarity_sum / self.hits if self.hits else None
+        }
@@ -1,24 +1,498 @@
-from typing import Dict, List
+import asyncio
+import html
+import re
+import string
+from typing import Dict, Iterator, List
 import logging
-from datetime import datetime
+from collections import defaultdict
+from datetime import date
+from functools import lru_cache
+from sentence_transformers import CrossEncoder
+
+from .letter_cache import LetterCache, identity_key
+
+# Compiled formatter, built with `cythonize -i app/text_formatting.pyx`
+try:
+    from .text_formatting import format_text
+except ImportError:
+    format_text = None
 
 logger = logging.getLogger(__name__)
 
+# Markdown-style formatting patterns, matched in a single pass
+_ITALIC_RE = re.compile(r'(?<!\*)\*(?!\*)([^*]+)\*(?!\*)')
+_FORMAT_RE = re.compile(
+    r'\*\*(?P<bold>.*?)\*\*'
+    r'|(?<!\*)\*(?!\*)(?P<italic>[^*]+)\*(?!\*)'
+    r'|(?P<header>^[A-Z][A-Z\s]+:)'
+    r'|(?P<numbered>^\d+\.\s)',
+    re.MULTILINE
+)
+
+# Strips punctuation from search queries so near-identical cases embed identically
+_PUNCT_TBL = str.maketrans('', '', string.punctuation)
+
+@lru_cache(maxsize=2)
+def _format_date(ordinal: int) -> str:
+    """Format a date ordinal for document headers, at most once per day"""
+    return date.fromordinal(ordinal).strftime("%B %d, %Y")
+
+def _format_match(match) -> str:
+    """Render a single formatting token as HTML"""
+    kind = match.lastgroup
+    value = match.group(kind)
+    if kind == 'bold':
+        # Italics nested inside bold text
+        value = _ITALIC_RE.sub(r'<em>\1</em>', value)
+        return f'<strong>{value}</strong>'
+    if kind == 'italic':
+        return f'<em>{value}</em>'
+    if kind == 'header':
+        return f'<div class="section-header">{value}</div>'
+    return f'<strong>{value}</strong>'
+
+# Static HTML fragments for exports; only the dynamic fields are interpolated per request
+_HTML_HEAD = """<html>
+<head>
+<style>
+"""
+
+_LETTER_CSS = """    body {
+        font-family: 'Times New Roman', serif;
+        margin: 1.5in 1in 1in 1in;
+        line-height: 1.6;
+        color: #000000;
+        font-size: 12pt;
+        background: white;
+    }
+    .letterhead {
+        text-align: center;
+        margin-bottom: 2em;
+        border-bottom: 2px solid #000000;
+        padding-bottom: 1em;
+    }
+    .letterhead h1 {
+        font-size: 18pt;
+        font-weight: bold;
+        margin: 0 0 0.5em 0;
+        letter-spacing: 2pt;
+        text-transform: uppercase;
+    }
+    .firm-details {
+        font-size: 11pt;
+        margin: 0.5em 0;
+        line-height: 1.4;
+    }
+    .date-section {
+        text-align: right;
+        margin: 2em 0 1.5em 0;
+        font-weight: bold;
+    }
+    .recipient {
+        margin: 1.5em 0;
+        line-height: 1.4;
+    }
+    .subject-line {
+        margin: 1.5em 0;
+        font-weight: bold;
+        text-decoration: underline;
+    }
+    .content {
+        text-align: justify;
+        margin: 1.5em 0;
+        font-size: 12pt;
+    }
+    .content h2 {
+        font-size: 14pt;
+        font-weight: bold;
+        margin: 1.5em 0 1em 0;
+        text-decoration: underline;
+    }
+    .content p {
+        margin: 1em 0;
+        text-indent: 0.5in;
+    }
+    .section-header {
+        font-weight: bold;
+        text-decoration: underline;
+        margin: 1.5em 0 0.5em 0;
+        text-indent: 0;
+    }
+    .legal-provisions {
+        margin: 2em 0;
+        padding: 1em;
+        border: 1px solid #000000;
+    }
+    .legal-provisions h3 {
+        font-size: 12pt;
+        font-weight: bold;
+        margin-bottom: 1em;
+        text-align: center;
+        text-decoration: underline;
+    }
+    .legal-provisions ul {
+        list-style-type: decimal;
+        margin: 0;
+        padding-left: 1.5em;
+    }
+    .legal-provisions li {
+        margin: 0.5em 0;
+        font-style: italic;
+    }
+    .signature-block {
+        margin-top: 3em;
+        text-align: left;
+    }
+    .signature-line {
+        margin-top: 2em;
+        margin-bottom: 0.5em;
+    }
+    .typed-name {
+        font-weight: bold;
+    }
+    strong, b { font-weight: bold; }
+    em, i { font-style: italic; }
+
+    @media print {
+        body { margin: 1in; font-size: 11pt; }
+        .letterhead { break-after: avoid; }
+        .legal-provisions { break-inside: avoid; }
+        .signature-block { break-inside: avoid; }
+    }
+"""
+
+_LETTER_HTML_MID = """</style>
+</head>
+<body>
+    <div class="letterhead">
+        <h1>{law_firm_name}</h1>
+        <div class="firm-details">
+            {law_firm_address}<br>
+            {law_firm_city}, {law_firm_state} {law_firm_zip}<br>
+            Phone: {law_firm_phone}<br>
+            Email: {law_firm_email}
+        </div>
+    </div>
+
+    <div class="date-section">
+        {current_date}
+    </div>
+
+    <div class="recipient">
+        {recipient_name}<br>
+        {recipient_organization}<br>
+        {recipient_address}<br>
+        {recipient_city}, {recipient_state} {recipient_zip}
+    </div>
+
+    <div class="subject-line">
+        <strong>Re:</strong> {case_title}
+    </div>
+
+    <div class="content">
+        <p><strong>Dear Sir/Madam,</strong></p>
+"""
+
+_LETTER_HTML_TAIL = """
+    </div>
+
+    <div class="legal-provisions">
+        <h3>Legal Provisions Referenced</h3>
+        <ul>
+            {supporting_sections_html}
+        </ul>
+    </div>
+
+    <div class="signature-block">
+        <p>Respectfully submitted,</p>
+
+        <div class="signature-line">
+            _________________________<br>
+            <span class="typed-name">{advocate_name}</span><br>
+            Legal Counsel for {client_name}<br>
+            {bar_registration_html}
+            {law_firm_phone}<br>
+            {law_firm_email}
+        </div>
+    </div>
+</body>
+</html>
+"""
+
+# Fallbacks used when a case document lacks letterhead or recipient fields
+_LETTER_DEFAULTS = {
+    "law_firm_name": "Law Firm",
+    "recipient_name": "[Recipient Name]",
+    "recipient_organization": "[Organization]",
+    "recipient_address": "[Address]",
+    "recipient_city": "[City]",
+    "recipient_state": "[State]",
+    "recipient_zip": "[ZIP]"
+}
+
+_ARGS_CSS = """    body {
+        font-family: 'Times New Roman', serif;
+        margin: 30px;
+        line-height: 1.8;
+        color: #2c3e50;
+        background-color: #ffffff;
+    }
+    .header {
+        text-align: center;
+        margin-bottom: 40px;
+        border-bottom: 3px solid #34495e;
+        padding-bottom: 20px;
+    }
+    .law-firm {
+        font-size: 1.2em;
+        font-weight: bold;
+        color: #2c3e50;
+        margin-bottom: 10px;
+    }
+    .advocate-details {
+        font-size: 1em;
+        color: #7f8c8d;
+        font-style: italic;
+    }
+    .document-title {
+        font-size: 1.8em;
+        font-weight: bold;
+        color: #c0392b;
+        margin: 30px 0;
+        text-align: center;
+        text-transform: uppercase;
+        letter-spacing: 1px;
+    }
+    .case-info {
+        background: #ecf0f1;
+        padding: 20px;
+        border-left: 5px solid #3498db;
+        margin: 25px 0;
+        border-radius: 5px;
+    }
+    .case-title {
+        font-size: 1.3em;
+        font-weight: bold;
+        color: #2c3e50;
+        margin-bottom: 10px;
+    }
+    .client-info {
+        color: #7f8c8d;
+        font-size: 0.95em;
+    }
+    .date-section {
+        text-align: right;
+        margin: 20px 0;
+        font-weight: bold;
+        color: #34495e;
+    }
+    .content {
+        text-align: justify;
+        margin: 30px 0;
+        font-size: 1.05em;
+    }
+    .arguments-section {
+        background: #f8f9fa;
+        padding: 25px;
+        border-radius: 8px;
+        margin: 25px 0;
+        border: 1px solid #dee2e6;
+    }
+    .arguments-title {
+        font-size: 1.4em;
+        font-weight: bold;
+        color: #c0392b;
+        margin-bottom: 20px;
+        text-align: center;
+        text-transform: uppercase;
+    }
+    .legal-ref {
+        background: #ffffff;
+        border: 2px solid #3498db;
+        padding: 20px;
+        margin: 25px 0;
+        border-radius: 8px;
+    }
+    .legal-ref h3 {
+        color: #2980b9;
+        font-size: 1.2em;
+        margin-bottom: 15px;
+        text-align: center;
+    }
+    .legal-ref ul {
+        list-style-type: none;
+        padding-left: 0;
+    }
+    .legal-ref li {
+        background: #ecf0f1;
+        margin: 8px 0;
+        padding: 10px 15px;
+        border-left: 4px solid #3498db;
+        font-style: italic;
+        color: #2c3e50;
+    }
+    .signature {
+        margin-top: 50px;
+        padding-top: 30px;
+        border-top: 2px solid #bdc3c7;
+    }
+    .signature-block {
+        text-align: left;
+        margin-top: 40px;
+    }
+    .confidential {
+        position: fixed;
+        bottom: 20px;
+        right: 20px;
+        background: #e74c3c;
+        color: white;
+        padding: 10px 15px;
+        border-radius: 5px;
+        font-size: 0.9em;
+        font-weight: bold;
+        transform: rotate(-45deg);
+        opacity: 0.8;
+    }
+    .page-header {
+        font-size: 0.9em;
+        color: #7f8c8d;
+        text-align: center;
+        margin-bottom: 20px;
+        border-bottom: 1px solid #bdc3c7;
+        padding-bottom: 10px;
+    }
+    .disclaimer {
+        background: #fff3cd;
+        border: 1px solid #ffeaa7;
+        color: #856404;
+        padding: 15px;
+        margin: 25px 0;
+        border-radius: 5px;
+        font-size: 0.95em;
+        text-align: center;
+        font-style: italic;
+    }
+    h1, h2, h3 {
+        color: #2c3e50;
+        font-weight: bold;
+    }
+    h2 {
+        border-bottom: 2px solid #3498db;
+        padding-bottom: 10px;
+        margin-top: 30px;
+    }
+"""
+
+_ARGS_HTML_MID = """</style>
+</head>
+<body>
+    <div class="page-header">
+        LEGAL STRATEGY & ARGUMENTS - CONFIDENTIAL ATTORNEY WORK PRODUCT
+    </div>
+
+    <div class="header">
+        <div class="law-firm">LEGAL STRATEGY DOCUMENT</div>
+        <div class="advocate-details">
+            <strong>{advocate_name}</strong><br>
+            Legal Representative for {client_name}
+        </div>
+    </div>
+
+    <div class="document-title">
+        Legal Arguments & Strategic Analysis
+    </div>
+
+    <div class="case-info">
+        <div class="case-title">Re: {case_title}</div>
+        <div class="client-info">
+            <strong>Client:</strong> {client_name}<br>
+            <strong>Legal Counsel:</strong> {advocate_name}<br>
+            <strong>Case Tags:</strong> {case_tags}
+        </div>
+    </div>
+
+    <div class="date-section">
+        <strong>Date of Analysis:</strong> {current_date}
+    </div>
+
+    <div class="disclaimer">
+        <strong>CONFIDENTIALITY NOTICE:</strong> This document contains attorney work product and privileged information.
+        It is intended solely for internal case preparation and strategic planning.
+    </div>
+
+    <div class="arguments-section">
+        <div class="arguments-title">Detailed Legal Analysis</div>
+        <div class="content">
+"""
+
+_ARGS_HTML_TAIL = """
+        </div>
+    </div>
+
+    <div class="legal-ref">
+        <h3>Referenced Legal Provisions from Indian Penal Code</h3>
+        <ul>
+            {supporting_sections_html}
+        </ul>
+    </div>
+
+    <div class="signature">
+        <div class="signature-block">
+            <p><strong>Prepared by:</strong><br><br>
+            <strong>{advocate_name}</strong><br>
+            Legal Counsel<br>
+            Date: {current_date}</p>
+
+            <p style="margin-top: 30px; font-style: italic; color: #7f8c8d;">
+                <strong>Note:</strong> This document is prepared for internal case strategy and should not be disclosed
+                to opposing parties or used in formal legal proceedings without proper review and modification.
+            </p>
+        </div>
+    </div>
+
+    <div class="confidential">
+        CONFIDENTIAL
+    </div>
+</body>
+</html>
+"""
+
 class LegalLetterGenerator:
     def __init__(self, rag_system):
         self.rag_system = rag_system
+        self.cache = LetterCache(rag_system.embeddings_model.get_sentence_embedding_dimension())
+        self.reranker = CrossEncoder('cross-encoder/ms-marco-MiniLM-L-6-v2')
     
-    def generate_formal_letter(self, case_data: Dict) -> Dict[str, str]:
+    async def generate_formal_letter(self, case_data: Dict) -> Dict[str, str]:
         """Generate formal legal letter"""
         
         # Search for relevant legal sections
-        search_query = f"{case_data['case_title']} {case_data['incident_summary']} {' '.join(case_data.get('tags', []))}"
-        relevant_docs = self.rag_system.similarity_search(search_query, k=7)
+        parts = (case_data['case_title'], case_data['incident_summary'], *case_data.get('tags', ()))
+        search_query = ' '.join(parts).lower().translate(_PUNCT_TBL).strip()
+        query_embedding = await asyncio.to_thread(self.rag_system.embed_query, search_query)
         
-        # Generate letter content
-        letter_prompt = f"""
-        Generate a formal legal letter based on the following case details and legal context:
+        # Semantically equivalent cases reuse the cached generation, but only for
+        # the same client, advocate, firm and recipient
+        partition = identity_key(case_data)
+        cached = self.cache.lookup(query_embedding, partition)
+        if cached:
+            logger.info("Letter cache hit")
+            return cached
+        
+        relevant_docs = await asyncio.to_thread(
+            self.rag_system.similarity_search, search_query, k=7, query_embedding=query_embedding
+        )
+        
+        # Rerank retrieved sections and keep only the best ones as prompt context
+        relevant_docs = await asyncio.to_thread(self._rerank, search_query, relevant_docs)
+        context_docs = relevant_docs[:3]
+        
+        # Both prompts share the same formatted context
+        context_str = self._format_context(context_docs)
         
+        # Shared case details and context lead both prompts so prefix-caching
+        # backends can reuse the computed prefix for the second call
+        shared_prefix = f"""
         Case Title: {case_data['case_title']}
         Client Name: {case_data['client_name']}
         Advocate Name: {case_data['advocate_name']}
@@ -27,7 +501,12 @@ class LegalLetterGenerator:
         Tags: {', '.join(case_data.get('tags', []))}
         
         Legal Context:
-        {self._format_context(relevant_docs)}
+        {context_str}
+        """
+        
+        # Generate letter content
+        letter_prompt = shared_prefix + """
+        Generate a formal legal letter based on the case details and legal context above.
         
         Please generate a formal legal letter that includes:
         1. Clear statement of facts
@@ -39,17 +518,9 @@ class LegalLetterGenerator:
         Do not include letterhead formatting as that will be handled separately.
         """
         
-        formal_letter_response = self.rag_system.generate_response(letter_prompt, relevant_docs)
-        
         # Generate supporting arguments
-        arguments_prompt = f"""
-        Based on the case details and legal context provided, generate detailed legal arguments that support the employee's position:
-        
-        Case: {case_data['case_title']}
-        Summary: {case_data['incident_summary']}
-        
-        Legal Context:
-        {self._format_context(relevant_docs)}
+        arguments_prompt = shared_prefix + """
+        Based on the case details and legal context above, generate detailed legal arguments that support the employee's position.
         
         Provide:
         1. Key legal arguments
@@ -59,7 +530,11 @@ class LegalLetterGenerator:
         5. Potential counterarguments and responses
         """
         
-        legal_arguments_response = self.rag_system.generate_response(arguments_prompt, relevant_docs)
+        # Both prompts share the same context and run concurrently
+        formal_letter_response, legal_arguments_response = await asyncio.gather(
+            self.rag_system.agenerate_response(letter_prompt, context_docs),
+            self.rag_system.agenerate_response(arguments_prompt, context_docs)
+        )
         
         # Extract string content from AIMessage objects
         formal_letter = self._extract_content(formal_letter_response)
@@ -71,12 +546,30 @@ class LegalLetterGenerator:
             for doc in relevant_docs[:5]
         ]
         
-        return {
+        result = {
             "formal_letter": formal_letter,
             "legal_arguments": legal_arguments,
             "supporting_sections": supporting_sections,
             "relevant_documents": relevant_docs
         }
+        if "Error generating response" not in (formal_letter, legal_arguments):
+            self.cache.add(query_embedding, result, partition)
+        
+        return result
+    
+    def _rerank(self, query: str, docs: List[Dict]) -> List[Dict]:
+        """Sort documents by cross-encoder relevance to the query"""
+        if not docs:
+            return docs
+        
+        scores = self.reranker.predict(
+            [(query, doc['content'][:512]) for doc in docs],
+            batch_size=len(docs)
+        )
+        for doc, score in zip(docs, scores):
+            doc["rerank_score"] = float(score)
+        
+        return sorted(docs, key=lambda doc: doc["rerank_score"], reverse=True)
     
     def _extract_content(self, response) -> str:
         """Extract string content from LangChain response objects"""
@@ -89,445 +582,68 @@ class LegalLetterGenerator:
     
     def _format_context(self, docs: List[Dict]) -> str:
         """Format documents for context"""
-        formatted = []
-        for doc in docs:
-            formatted.append(f"Section: {doc['section_title']}\nContent: {doc['content'][:500]}...")
-        return "\n\n".join(formatted)
+        return "\n\n".join(f"Section: {doc['section_title']}\nContent: {doc['content'][:500]}..." for doc in docs)
     
     def format_letter_for_export(self, letter_data: Dict, case_data: Dict) -> str:
         """Format letter for PDF export with complete dynamic letterhead"""
-        current_date = datetime.now().strftime("%B %d, %Y")
+        return "".join(self.iter_letter_html(letter_data, case_data))
+
+    def iter_letter_html(self, letter_data: Dict, case_data: Dict) -> Iterator[str]:
+        """Yield the letter export HTML: static style block first, then the dynamic fragments"""
+        yield _HTML_HEAD
+        yield _LETTER_CSS
+        
+        # Missing case fields render as their defaults or empty strings
+        fields = defaultdict(str, _LETTER_DEFAULTS)
+        fields.update(case_data)
+        fields["current_date"] = _format_date(date.today().toordinal())
+        fields["supporting_sections_html"] = self._format_sections_html(letter_data.get('supporting_sections', []))
+        fields["bar_registration_html"] = (
+            'Bar Registration: ' + case_data['bar_registration_number'] + '<br>'
+            if case_data.get('bar_registration_number') else ''
+        )
+        yield _LETTER_HTML_MID.format_map(fields)
         
         # Extract content
         formal_letter = self._extract_content(letter_data.get('formal_letter', ''))
-        formal_letter = self._process_text_formatting(formal_letter)
-        
-        formatted_letter = f"""
-        <html>
-        <head>
-            <style>
-                body {{ 
-                    font-family: 'Times New Roman', serif; 
-                    margin: 1.5in 1in 1in 1in; 
-                    line-height: 1.6; 
-                    color: #000000;
-                    font-size: 12pt;
-                    background: white;
-                }}
-                .letterhead {{ 
-                    text-align: center; 
-                    margin-bottom: 2em;
-                    border-bottom: 2px solid #000000;
-                    padding-bottom: 1em;
-                }}
-                .letterhead h1 {{
-                    font-size: 18pt;
-                    font-weight: bold;
-                    margin: 0 0 0.5em 0;
-                    letter-spacing: 2pt;
-                    text-transform: uppercase;
-                }}
-                .firm-details {{
-                    font-size: 11pt;
-                    margin: 0.5em 0;
-                    line-height: 1.4;
-                }}
-                .date-section {{ 
-                    text-align: right; 
-                    margin: 2em 0 1.5em 0;
-                    font-weight: bold;
-                }}
-                .recipient {{
-                    margin: 1.5em 0;
-                    line-height: 1.4;
-                }}
-                .subject-line {{
-                    margin: 1.5em 0;
-                    font-weight: bold;
-                    text-decoration: underline;
-                }}
-                .content {{ 
-                    text-align: justify; 
-                    margin: 1.5em 0;
-                    font-size: 12pt;
-                }}
-                .content h2 {{
-                    font-size: 14pt;
-                    font-weight: bold;
-                    margin: 1.5em 0 1em 0;
-                    text-decoration: underline;
-                }}
-                .content p {{
-                    margin: 1em 0;
-                    text-indent: 0.5in;
-                }}
-                .section-header {{
-                    font-weight: bold;
-                    text-decoration: underline;
-                    margin: 1.5em 0 0.5em 0;
-                    text-indent: 0;
-                }}
-                .legal-provisions {{ 
-                    margin: 2em 0;
-                    padding: 1em;
-                    border: 1px solid #000000;
-                }}
-                .legal-provisions h3 {{
-                    font-size: 12pt;
-                    font-weight: bold;
-                    margin-bottom: 1em;
-                    text-align: center;
-                    text-decoration: underline;
-                }}
-                .legal-provisions ul {{ 
-                    list-style-type: decimal;
-                    margin: 0;
-                    padding-left: 1.5em;
-                }}
-                .legal-provisions li {{ 
-                    margin: 0.5em 0;
-                    font-style: italic;
-                }}
-                .signature-block {{ 
-                    margin-top: 3em;
-                    text-align: left;
-                }}
-                .signature-line {{
-                    margin-top: 2em;
-                    margin-bottom: 0.5em;
-                }}
-                .typed-name {{
-                    font-weight: bold;
-                }}
-                strong, b {{ font-weight: bold; }}
-                em, i {{ font-style: italic; }}
-                
-                @media print {{
-                    body {{ margin: 1in; font-size: 11pt; }}
-                    .letterhead {{ break-after: avoid; }}
-                    .legal-provisions {{ break-inside: avoid; }}
-                    .signature-block {{ break-inside: avoid; }}
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="letterhead">
-                <h1>{case_data.get('law_firm_name', 'Law Firm')}</h1>
-                <div class="firm-details">
-                    {case_data.get('law_firm_address', '')}<br>
-                    {case_data.get('law_firm_city', '')}, {case_data.get('law_firm_state', '')} {case_data.get('law_firm_zip', '')}<br>
-                    Phone: {case_data.get('law_firm_phone', '')}<br>
-                    Email: {case_data.get('law_firm_email', '')}
-                </div>
-            </div>
-            
-            <div class="date-section">
-                {current_date}
-            </div>
-            
-            <div class="recipient">
-                {case_data.get('recipient_name', '[Recipient Name]')}<br>
-                {case_data.get('recipient_organization', '[Organization]')}<br>
-                {case_data.get('recipient_address', '[Address]')}<br>
-                {case_data.get('recipient_city', '[City]')}, {case_data.get('recipient_state', '[State]')} {case_data.get('recipient_zip', '[ZIP]')}
-            </div>
-            
-            <div class="subject-line">
-                <strong>Re:</strong> {case_data['case_title']}
-            </div>
-            
-            <div class="content">
-                <p><strong>Dear Sir/Madam,</strong></p>
-                {formal_letter}
-            </div>
-            
-            <div class="legal-provisions">
-                <h3>Legal Provisions Referenced</h3>
-                <ul>
-                    {''.join([f"<li>{section}</li>" for section in letter_data.get('supporting_sections', [])])}
-                </ul>
-            </div>
-            
-            <div class="signature-block">
-                <p>Respectfully submitted,</p>
-                
-                <div class="signature-line">
-                    _________________________<br>
-                    <span class="typed-name">{case_data['advocate_name']}</span><br>
-                    Legal Counsel for {case_data['client_name']}<br>
-                    {'Bar Registration: ' + case_data.get('bar_registration_number', '') + '<br>' if case_data.get('bar_registration_number') else ''}
-                    {case_data.get('law_firm_phone', '')}<br>
-                    {case_data.get('law_firm_email', '')}
-                </div>
-            </div>
-        </body>
-        </html>
-        """
+        yield self._process_text_formatting(formal_letter)
         
-        return formatted_letter
-    
+        yield _LETTER_HTML_TAIL.format_map(fields)
+
     def _process_text_formatting(self, text: str) -> str:
         """Process markdown-style formatting for professional legal document"""
-        import re
-        
-        # Handle **bold** text
-        text = re.sub(r'\*\*(.*?)\*\*', r'<strong>\1</strong>', text)
-        
-        # Handle *italic* text
-        text = re.sub(r'(?<!\*)\*(?!\*)([^*]+)\*(?!\*)', r'<em>\1</em>', text)
-        
-        # Handle section headers
-        text = re.sub(r'^([A-Z][A-Z\s]+:)', r'<div class="section-header">\1</div>', text, flags=re.MULTILINE)
+        if format_text is not None:
+            return format_text(text)
         
-        # Handle numbered points
-        text = re.sub(r'^(\d+\.\s)', r'<strong>\1</strong>', text, flags=re.MULTILINE)
+        # Handle bold, italic, section headers and numbered points in one scan
+        text = _FORMAT_RE.sub(_format_match, text)
         
         # Convert paragraphs
-        paragraphs = text.split('\n\n')
-        formatted_paragraphs = []
-        
-        for paragraph in paragraphs:
-            paragraph = paragraph.strip()
-            if paragraph:
-                formatted_paragraphs.append(f'<p>{paragraph}</p>')
-        
-        return '\n'.join(formatted_paragraphs)
+        return '\n'.join(f'<p>{p.strip()}</p>' for p in text.split('\n\n') if p.strip())
+    
+    def _format_sections_html(self, sections: List[str]) -> str:
+        """Format supporting sections as escaped list items"""
+        return ''.join(f'<li>{html.escape(section)}</li>' for section in sections)
 
 
 
     def format_arguments_for_export(self, letter_data: Dict, case_data: Dict) -> str:
         """Format legal arguments for PDF export with professional styling"""
-        current_date = datetime.now().strftime("%B %d, %Y")
+        return "".join(self.iter_arguments_html(letter_data, case_data))
+
+    def iter_arguments_html(self, letter_data: Dict, case_data: Dict) -> Iterator[str]:
+        """Yield the arguments export HTML: static style block first, then the dynamic fragments"""
+        yield _HTML_HEAD
+        yield _ARGS_CSS
+        
+        fields = defaultdict(str, case_data)
+        fields["current_date"] = _format_date(date.today().toordinal())
+        fields["case_tags"] = ', '.join(case_data.get('tags', ['N/A']))
+        fields["supporting_sections_html"] = self._format_sections_html(letter_data.get('supporting_sections', []))
+        yield _ARGS_HTML_MID.format_map(fields)
         
         # Extract content
         legal_arguments = self._extract_content(letter_data.get('legal_arguments', ''))
+        yield self._process_text_formatting(legal_arguments)
         
-        legal_arguments = self._process_text_formatting(legal_arguments)
-        formatted_arguments = f"""
-        <html>
-        <head>
-            <style>
-                body {{ 
-                    font-family: 'Times New Roman', serif; 
-                    margin: 30px; 
-                    line-height: 1.8; 
-                    color: #2c3e50;
-                    background-color: #ffffff;
-                }}
-                .header {{ 
-                    text-align: center; 
-                    margin-bottom: 40px; 
-                    border-bottom: 3px solid #34495e;
-                    padding-bottom: 20px;
-                }}
-                .law-firm {{ 
-                    font-size: 1.2em; 
-                    font-weight: bold; 
-                    color: #2c3e50;
-                    margin-bottom: 10px;
-                }}
-                .advocate-details {{ 
-                    font-size: 1em; 
-                    color: #7f8c8d;
-                    font-style: italic;
-                }}
-                .document-title {{ 
-                    font-size: 1.8em; 
-                    font-weight: bold; 
-                    color: #c0392b;
-                    margin: 30px 0;
-                    text-align: center;
-                    text-transform: uppercase;
-                    letter-spacing: 1px;
-                }}
-                .case-info {{ 
-                    background: #ecf0f1; 
-                    padding: 20px; 
-                    border-left: 5px solid #3498db;
-                    margin: 25px 0;
-                    border-radius: 5px;
-                }}
-                .case-title {{ 
-                    font-size: 1.3em; 
-                    font-weight: bold; 
-                    color: #2c3e50;
-                    margin-bottom: 10px;
-                }}
-                .client-info {{ 
-                    color: #7f8c8d; 
-                    font-size: 0.95em;
-                }}
-                .date-section {{ 
-                    text-align: right; 
-                    margin: 20px 0;
-                    font-weight: bold;
-                    color: #34495e;
-                }}
-                .content {{ 
-                    text-align: justify; 
-                    margin: 30px 0;
-                    font-size: 1.05em;
-                }}
-                .arguments-section {{ 
-                    background: #f8f9fa;
-                    padding: 25px;
-                    border-radius: 8px;
-                    margin: 25px 0;
-                    border: 1px solid #dee2e6;
-                }}
-                .arguments-title {{ 
-                    font-size: 1.4em; 
-                    font-weight: bold; 
-                    color: #c0392b;
-                    margin-bottom: 20px;
-                    text-align: center;
-                    text-transform: uppercase;
-                }}
-                .legal-ref {{ 
-                    background: #ffffff;
-                    border: 2px solid #3498db;
-                    padding: 20px;
-                    margin: 25px 0;
-                    border-radius: 8px;
-                }}
-                .legal-ref h3 {{ 
-                    color: #2980b9; 
-                    font-size: 1.2em;
-                    margin-bottom: 15px;
-                    text-align: center;
-                }}
-                .legal-ref ul {{ 
-                    list-style-type: none;
-                    padding-left: 0;
-                }}
-                .legal-ref li {{ 
-                    background: #ecf0f1;
-                    margin: 8px 0;
-                    padding: 10px 15px;
-                    border-left: 4px solid #3498db;
-                    font-style: italic;
-                    color: #2c3e50;
-                }}
-                .signature {{ 
-                    margin-top: 50px; 
-                    padding-top: 30px;
-                    border-top: 2px solid #bdc3c7;
-                }}
-                .signature-block {{ 
-                    text-align: left;
-                    margin-top: 40px;
-                }}
-                .confidential {{ 
-                    position: fixed;
-                    bottom: 20px;
-                    right: 20px;
-                    background: #e74c3c;
-                    color: white;
-                    padding: 10px 15px;
-                    border-radius: 5px;
-                    font-size: 0.9em;
-                    font-weight: bold;
-                    transform: rotate(-45deg);
-                    opacity: 0.8;
-                }}
-                .page-header {{ 
-                    font-size: 0.9em; 
-                    color: #7f8c8d; 
-                    text-align: center;
-                    margin-bottom: 20px;
-                    border-bottom: 1px solid #bdc3c7;
-                    padding-bottom: 10px;
-                }}
-                .disclaimer {{ 
-                    background: #fff3cd;
-                    border: 1px solid #ffeaa7;
-                    color: #856404;
-                    padding: 15px;
-                    margin: 25px 0;
-                    border-radius: 5px;
-                    font-size: 0.95em;
-                    text-align: center;
-                    font-style: italic;
-                }}
-                h1, h2, h3 {{ 
-                    color: #2c3e50; 
-                    font-weight: bold;
-                }}
-                h2 {{ 
-                    border-bottom: 2px solid #3498db;
-                    padding-bottom: 10px;
-                    margin-top: 30px;
-                }}
-            </style>
-        </head>
-        <body>
-            <div class="page-header">
-                LEGAL STRATEGY & ARGUMENTS - CONFIDENTIAL ATTORNEY WORK PRODUCT
-            </div>
-            
-            <div class="header">
-                <div class="law-firm">LEGAL STRATEGY DOCUMENT</div>
-                <div class="advocate-details">
-                    <strong>{case_data['advocate_name']}</strong><br>
-                    Legal Representative for {case_data['client_name']}
-                </div>
-            </div>
-            
-            <div class="document-title">
-                Legal Arguments & Strategic Analysis
-            </div>
-            
-            <div class="case-info">
-                <div class="case-title">Re: {case_data['case_title']}</div>
-                <div class="client-info">
-                    <strong>Client:</strong> {case_data['client_name']}<br>
-                    <strong>Legal Counsel:</strong> {case_data['advocate_name']}<br>
-                    <strong>Case Tags:</strong> {', '.join(case_data.get('tags', ['N/A']))}
-                </div>
-            </div>
-            
-            <div class="date-section">
-                <strong>Date of Analysis:</strong> {current_date}
-            </div>
-            
-            <div class="disclaimer">
-                <strong>CONFIDENTIALITY NOTICE:</strong> This document contains attorney work product and privileged information. 
-                It is intended solely for internal case preparation and strategic planning.
-            </div>
-            
-            <div class="arguments-section">
-                <div class="arguments-title">Detailed Legal Analysis</div>
-                <div class="content">
-                    {legal_arguments}
-                </div>
-            </div>
-            
-            <div class="legal-ref">
-                <h3>Referenced Legal Provisions from Indian Penal Code</h3>
-                <ul>
-                    {''.join([f"<li>{section}</li>" for section in letter_data.get('supporting_sections', [])])}
-                </ul>
-            </div>
-            
-            <div class="signature">
-                <div class="signature-block">
-                    <p><strong>Prepared by:</strong><br><br>
-                    <strong>{case_data['advocate_name']}</strong><br>
-                    Legal Counsel<br>
-                    Date: {current_date}</p>
-                    
-                    <p style="margin-top: 30px; font-style: italic; color: #7f8c8d;">
-                        <strong>Note:</strong> This document is prepared for internal case strategy and should not be disclosed 
-                        to opposing parties or used in formal legal proceedings without proper review and modification.
-                    </p>
-                </div>
-            </div>
-            
-            <div class="confidential">
-                CONFIDENTIAL
-            </div>
-        </body>
-        </html>
-        """
-        
-        return formatted_arguments
+        yield _ARGS_HTML_TAIL.format_map(fields)
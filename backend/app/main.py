@@ -1,13 +1,22 @@
 # Entry point for FastAPI app
-from fastapi import FastAPI, HTTPException, BackgroundTasks
+from fastapi import FastAPI, HTTPException, BackgroundTasks, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import HTMLResponse, ORJSONResponse, StreamingResponse
 from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
+from datetime import date, datetime
+from typing import AsyncIterator, Dict, Iterator, Optional, Tuple
+from bson import ObjectId
+from cachetools import TTLCache
 from dotenv import load_dotenv
 
 from .models import CaseInput, CaseResponse, GeneratedLetter
-from .database import connect_to_mongo, close_mongo_connection, save_case, get_case, get_all_cases
+from .database import (
+    connect_to_mongo, close_mongo_connection, save_case, get_case, get_all_cases,
+    save_cached_letters, get_cached_letters
+)
 from .pdf_processor import PDFProcessor
 from .rag_system import RAGSystem
 from .letter_generator import LegalLetterGenerator
@@ -19,23 +28,50 @@ load_dotenv()
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Initialize global variables
-rag_system = None
-letter_generator = None
+# Common case topics used to warm the retriever after startup
+WARMUP_QUERIES = [
+    "harassment at workplace",
+    "sexual harassment complaint",
+    "unpaid salary wages withheld",
+    "wrongful termination dismissal",
+    "discrimination against employee",
+    "contract violation breach of agreement",
+    "workplace safety issues",
+    "overtime disputes unpaid overtime",
+    "benefits denial gratuity provident fund",
+    "retaliation against complainant",
+    "criminal intimidation threats",
+    "criminal breach of trust employer",
+    "cheating and fraud",
+    "defamation of employee",
+    "wrongful confinement",
+    "assault at workplace",
+    "hurt caused by employer",
+    "forgery of documents",
+    "misappropriation of property",
+    "abetment of offence"
+]
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup
-    await connect_to_mongo()
-    await initialize_rag_system()
+    # Startup: connect to the database while the vector store loads
+    app.state.rag = None
+    app.state.letter_gen = None
+    app.state.rag_warmed = False
+    app.state.export_cache = TTLCache(maxsize=512, ttl=3600)
+    await asyncio.gather(connect_to_mongo(), initialize_rag_system(app))
+    await load_letter_cache(app)
+    warmup_task = asyncio.create_task(warm_retriever(app))
     yield
     # Shutdown
+    warmup_task.cancel()
     await close_mongo_connection()
 
 app = FastAPI(
     title="Legal Letter Generator API",
     description="AI-powered legal letter generation system",
     version="1.0.0",
+    default_response_class=ORJSONResponse,
     lifespan=lifespan
 )
 
@@ -48,12 +84,15 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-async def initialize_rag_system():
+async def initialize_rag_system(app: FastAPI):
+    """Initialize RAG system without blocking the event loop"""
+    await asyncio.to_thread(_sync_init_rag, app)
+
+def _sync_init_rag(app: FastAPI):
     """Initialize RAG system with legal documents"""
-    global rag_system, letter_generator
-    
     try:
         rag_system = RAGSystem()
+        app.state.rag = rag_system
         
         # Try to load existing vector store
         if not rag_system.load_vector_store():
@@ -76,45 +115,147 @@ async def initialize_rag_system():
             
             logger.info("RAG system initialized successfully")
         
-        letter_generator = LegalLetterGenerator(rag_system)
+        app.state.letter_gen = LegalLetterGenerator(rag_system)
         
     except Exception as e:
         logger.error(f"Error initializing RAG system: {str(e)}")
 
+async def load_letter_cache(app: FastAPI):
+    """Warm the letter cache from persisted entries"""
+    if app.state.letter_gen is None:
+        return
+    
+    try:
+        app.state.letter_gen.cache.load(await get_cached_letters())
+    except Exception as e:
+        logger.error(f"Error loading letter cache: {str(e)}")
+
+async def warm_retriever(app: FastAPI):
+    """Run common queries so the first real request finds the retriever warm"""
+    if app.state.letter_gen is None:
+        return
+    
+    try:
+        for query in WARMUP_QUERIES:
+            await asyncio.to_thread(app.state.rag.similarity_search, query, k=7)
+        app.state.rag_warmed = True
+        logger.info("Retriever warmed up")
+    except Exception as e:
+        logger.error(f"Error warming retriever: {str(e)}")
+
+def get_letter_gen(request: Request) -> LegalLetterGenerator:
+    """Letter generator dependency; 503 until the RAG system is initialized"""
+    letter_gen = request.app.state.letter_gen
+    if letter_gen is None:
+        raise HTTPException(status_code=503, detail="RAG system not initialized")
+    return letter_gen
+
+# `/cases?fields=summary`: everything the case lists show, without the letter bodies
+SUMMARY_FIELDS = [*CaseInput.model_fields, "created_at", "updated_at", "supporting_sections"]
+
+# Letter bodies served separately by `/cases/{case_id}/letter`
+LETTER_FIELDS = ["formal_letter", "legal_arguments", "supporting_sections"]
+
+# Export kind -> LegalLetterGenerator method yielding its HTML
+EXPORT_RENDERERS = {
+    "letter": "iter_letter_html",
+    "arguments": "iter_arguments_html"
+}
+
+def _export_key(kind: str, case: Dict) -> Tuple:
+    """Export cache key for a case revision"""
+    # The exports embed today's date, so it is part of the key as well
+    return (kind, case["_id"], case.get("updated_at") or case.get("created_at"), date.today())
+
+def render_export(request: Request, case: Dict, kind: str, letter_gen: LegalLetterGenerator) -> str:
+    """Rendered export HTML for a case, cached per case revision"""
+    cache = request.app.state.export_cache
+    key = _export_key(kind, case)
+    rendered = cache.get(key)
+    if rendered is None:
+        rendered = "".join(getattr(letter_gen, EXPORT_RENDERERS[kind])(case, case))
+        cache[key] = rendered
+    return rendered
+
+async def _iter_and_cache(chunks: Iterator[str], cache: TTLCache, key: Tuple) -> AsyncIterator[str]:
+    """Pass rendered chunks through and cache the full HTML once complete"""
+    # Async so Starlette drives it on the event loop rather than a threadpool worker;
+    # TTLCache is not thread-safe and every other cache access happens on the loop.
+    # Rendering is plain string building, so it does not block the loop noticeably
+    rendered = []
+    for chunk in chunks:
+        rendered.append(chunk)
+        yield chunk
+    cache[key] = "".join(rendered)
+
+def stream_export(request: Request, case: Dict, kind: str, letter_gen: LegalLetterGenerator):
+    """Serve cached export HTML directly, otherwise stream it while rendering"""
+    cache = request.app.state.export_cache
+    key = _export_key(kind, case)
+    rendered = cache.get(key)
+    if rendered is not None:
+        return HTMLResponse(content=rendered)
+    chunks = getattr(letter_gen, EXPORT_RENDERERS[kind])(case, case)
+    return StreamingResponse(_iter_and_cache(chunks, cache, key), media_type="text/html")
+
+async def save_case_task(db_data: Dict):
+    """Background save of a generated case"""
+    try:
+        await save_case(db_data)
+    except Exception as e:
+        logger.error(f"Error saving case {db_data['_id']}: {str(e)}")
+
+async def save_letter_cache_task(letter_gen: LegalLetterGenerator):
+    """Background save of new letter cache entries; pending entries are kept on failure"""
+    # Popped when the task runs, so entries added by earlier failed saves are included
+    entries = letter_gen.cache.pop_unsaved()
+    try:
+        await save_cached_letters(entries)
+    except Exception as e:
+        letter_gen.cache.requeue_unsaved(entries)
+        logger.error(f"Error saving letter cache: {str(e)}")
+
 @app.get("/")
 async def root():
     return {"message": "Legal Letter Generator API is running"}
 
 @app.get("/health")
-async def health_check():
+async def health_check(request: Request):
+    state = request.app.state
     return {
         "status": "healthy",
-        "rag_system_ready": rag_system is not None,
-        "letter_generator_ready": letter_generator is not None
+        "rag_system_ready": state.rag is not None and state.rag_warmed,
+        "letter_generator_ready": state.letter_gen is not None
     }
 
 @app.post("/generate-letter", response_model=CaseResponse)
-async def generate_letter(case_input: CaseInput):
+async def generate_letter(
+    case_input: CaseInput,
+    background_tasks: BackgroundTasks,
+    letter_gen: LegalLetterGenerator = Depends(get_letter_gen)
+):
     """Generate legal letter for a case"""
-    
-    if not rag_system or not letter_generator:
-        raise HTTPException(status_code=503, detail="RAG system not initialized")
-    
     try:
         # Convert input to dict
-        case_data = case_input.dict()
+        case_data = case_input.model_dump()
         
         # Generate letter
-        letter_data = letter_generator.generate_formal_letter(case_data)
+        letter_data = await letter_gen.generate_formal_letter(case_data)
         
-        # Prepare data for database
+        # Prepare data for database; the id is assigned here so the response
+        # does not wait on the insert
         db_data = {
             **case_data,
-            **letter_data
+            **letter_data,
+            "_id": ObjectId(),
+            "created_at": datetime.utcnow()
         }
+        case_id = str(db_data["_id"])
         
-        # Save to database
-        case_id = await save_case(db_data)
+        # Save to database after the response is sent; each task logs its own
+        # failures so one failing save does not skip the other
+        background_tasks.add_task(save_case_task, db_data)
+        background_tasks.add_task(save_letter_cache_task, letter_gen)
         
         # Create response
         generated_letter = GeneratedLetter(
@@ -137,6 +278,11 @@ async def generate_letter(case_input: CaseInput):
         logger.error(f"Error generating letter: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cache/stats")
+async def cache_stats(letter_gen: LegalLetterGenerator = Depends(get_letter_gen)):
+    """Get letter cache hit statistics"""
+    return letter_gen.cache.stats()
+
 @app.get("/case/{case_id}")
 async def get_case_details(case_id: str):
     """Get case details by ID"""
@@ -150,17 +296,33 @@ async def get_case_details(case_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/cases")
-async def list_all_cases():
-    """Get all cases"""
+async def list_all_cases(limit: int = 100, skip: int = 0, fields: Optional[str] = None):
+    """Get cases, newest first; `fields` is a comma-separated projection or `summary`"""
     try:
-        cases = await get_all_cases()
+        if fields == "summary":
+            projection = SUMMARY_FIELDS
+        else:
+            projection = [field.strip() for field in fields.split(",") if field.strip()] if fields else None
+        cases = await get_all_cases(fields=projection, limit=limit, skip=skip)
         return {"cases": cases}
     except Exception as e:
         logger.error(f"Error retrieving cases: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/cases/{case_id}/letter")
+async def get_case_letter(case_id: str):
+    """Get the generated letter bodies for a case"""
+    try:
+        letter = await get_case(case_id, fields=LETTER_FIELDS)
+    except Exception as e:
+        logger.error(f"Error retrieving case letter: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+    if not letter:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return letter
+
 @app.post("/export-pdf/{case_id}")
-async def export_case_pdf(case_id: str):
+async def export_case_pdf(case_id: str, request: Request, letter_gen: LegalLetterGenerator = Depends(get_letter_gen)):
     """Export case as PDF"""
     try:
         case = await get_case(case_id)
@@ -168,8 +330,8 @@ async def export_case_pdf(case_id: str):
             raise HTTPException(status_code=404, detail="Case not found")
         
         # Format for PDF export
-        formatted_html = letter_generator.format_letter_for_export(case, case)
-        argument_html = letter_generator.format_arguments_for_export(case,case)
+        formatted_html = render_export(request, case, "letter", letter_gen)
+        argument_html = render_export(request, case, "arguments", letter_gen)
         
         return {
             "success": True,
@@ -182,6 +344,31 @@ async def export_case_pdf(case_id: str):
         logger.error(f"Error exporting PDF: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/export-pdf/{case_id}/letter", response_class=HTMLResponse)
+async def export_case_letter_html(case_id: str, request: Request, letter_gen: LegalLetterGenerator = Depends(get_letter_gen)):
+    """Export formal letter HTML for a case"""
+    case = await get_case(case_id)
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return stream_export(request, case, "letter", letter_gen)
+
+@app.get("/export-pdf/{case_id}/arguments", response_class=HTMLResponse)
+async def export_case_arguments_html(case_id: str, request: Request, letter_gen: LegalLetterGenerator = Depends(get_letter_gen)):
+    """Export legal arguments HTML for a case"""
+    case = await get_case(case_id)
+    if not case:
+        raise HTTPException(status_code=404, detail="Case not found")
+    return stream_export(request, case, "arguments", letter_gen)
+
+@app.delete("/export-pdf/{case_id}/cache")
+async def purge_export_cache(case_id: str, request: Request):
+    """Drop cached export HTML for a case"""
+    cache = request.app.state.export_cache
+    keys = [key for key in list(cache.keys()) if key[1] == case_id]
+    for key in keys:
+        cache.pop(key, None)
+    return {"success": True, "purged": len(keys)}
+
 if __name__ == "__main__":
     import uvicorn
     uvicorn.run(app, host="0.0.0.0", port=9000)
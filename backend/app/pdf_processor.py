@@ -1,89 +1,210 @@
 # PDF processing utilities
 import fitz  # PyMuPDF
+import mmap
 import os
-from typing import List, Dict
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterator, List, Tuple
 import logging
 
+# Optional faster extractor for large documents
+try:
+    import pypdfium2 as pdfium
+except ImportError:
+    pdfium = None
+
 logger = logging.getLogger(__name__)
 
+# "pymupdf", "pdfium", or "auto" (pdfium for files of PDFIUM_MIN_BYTES or more)
+PDF_BACKEND = os.getenv("PDF_BACKEND", "auto")
+PDFIUM_MIN_BYTES = int(os.getenv("PDFIUM_MIN_BYTES", str(10 * 1024 * 1024)))
+
+# Below this many pages worker start-up costs more than it saves
+PARALLEL_MIN_PAGES = 16
+
+# Pages per worker task; at most two tasks per worker are in flight
+PAGE_BATCH_SIZE = 8
+
+# Line prefixes that open a section in legal documents
+HEADER_PREFIXES = ("Section", "Article", "Chapter")
+
+# PyMuPDF block tuple: (x0, y0, x1, y1, text, block_no, block_type); type 0 is text
+_BLOCK_TEXT = 4
+_BLOCK_TYPE = 6
+
+def _page_blocks(page) -> List[str]:
+    """Text of a page's text blocks in reading order, image blocks skipped"""
+    return [block[_BLOCK_TEXT] for block in page.get_text("blocks") if block[_BLOCK_TYPE] == 0]
+
+def _pdfium_page_blocks(page) -> List[str]:
+    """Text of a pdfium page; pdfium has no block layout, so each line is its own block"""
+    textpage = page.get_textpage()
+    try:
+        return textpage.get_text_range().splitlines()
+    finally:
+        textpage.close()
+
+def _iter_lines(blocks: List[str]) -> Iterator[str]:
+    """Stripped non-empty lines of a page's blocks, whichever backend produced them"""
+    for block in blocks:
+        for line in block.split('\n'):
+            line = line.strip()
+            if line:
+                yield line
+
+def _extract_page_range(pdf_path: str, start: int, stop: int, backend: str = "pymupdf") -> List[List[str]]:
+    """Extract text blocks for pages [start, stop), typically in a worker process"""
+    if backend == "pdfium":
+        document = pdfium.PdfDocument(pdf_path)
+        try:
+            return [_pdfium_page_blocks(document[page_num]) for page_num in range(start, stop)]
+        finally:
+            document.close()
+    
+    with fitz.open(pdf_path) as document:
+        return [_page_blocks(document[page_num]) for page_num in range(start, stop)]
+
 class PDFProcessor:
     def __init__(self, pdf_path: str):
         self.pdf_path = pdf_path
         self.document = None
+        self._mmap = None
+        self._buffer = None
         
     def load_pdf(self):
         """Load PDF document"""
         try:
-            self.document = fitz.open(self.pdf_path)
+            # Map the file instead of reading it; PyMuPDF reads a memoryview in place,
+            # so only the pages actually touched become resident
+            with open(self.pdf_path, "rb") as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            self._buffer = memoryview(self._mmap)
+            self.document = fitz.open(stream=self._buffer, filetype="pdf")
             logger.info(f"Successfully loaded PDF: {self.pdf_path}")
             return True
         except Exception as e:
             logger.error(f"Error loading PDF: {str(e)}")
             return False
     
-    def extract_text_by_pages(self) -> List[Dict[str, str]]:
-        """Extract text from all pages"""
-        if not self.document:
-            self.load_pdf()
+    def _select_backend(self) -> str:
+        """Pick the text extraction backend for this document"""
+        if pdfium is None or PDF_BACKEND == "pymupdf":
+            return "pymupdf"
+        if PDF_BACKEND == "pdfium" or os.path.getsize(self.pdf_path) >= PDFIUM_MIN_BYTES:
+            return "pdfium"
+        return "pymupdf"
+    
+    def _produce_pages(self, backend: str, page_count: int) -> Iterator[Tuple[int, List[str]]]:
+        """Yield (page_number, blocks) in page order"""
+        workers = min(os.cpu_count() or 1, -(-page_count // PAGE_BATCH_SIZE))
+        
+        if page_count < PARALLEL_MIN_PAGES or workers < 2:
+            if backend == "pdfium":
+                pages = _extract_page_range(self.pdf_path, 0, page_count, backend)
+            else:
+                pages = (_page_blocks(self.document[page_num]) for page_num in range(page_count))
+            for page_num, blocks in enumerate(pages):
+                yield page_num + 1, blocks
+            return
+        
+        # Each task opens its own handle on a small page range; a bounded window
+        # of tasks keeps memory flat while the consumer parses earlier pages
+        starts = iter(range(0, page_count, PAGE_BATCH_SIZE))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            pending = deque()
             
-        pages_data = []
-        for page_num in range(len(self.document)):
-            page = self.document[page_num]
-            text = page.get_text()
+            def submit_next():
+                start = next(starts, None)
+                if start is not None:
+                    stop = min(start + PAGE_BATCH_SIZE, page_count)
+                    pending.append((start, executor.submit(_extract_page_range, self.pdf_path, start, stop, backend)))
             
-            pages_data.append({
-                "page_number": page_num + 1,
-                "content": text,
-                "metadata": {
-                    "page_count": len(self.document),
-                    "source": self.pdf_path
-                }
-            })
+            for _ in range(workers * 2):
+                submit_next()
+            
+            while pending:
+                start, future = pending.popleft()
+                pages = future.result()
+                submit_next()
+                for offset, blocks in enumerate(pages):
+                    yield start + offset + 1, blocks
+    
+    def _iter_pages(self) -> Iterator[Dict]:
+        """Yield page text blocks one page at a time, in page order"""
+        if not self.document:
+            self.load_pdf()
+        
+        page_count = len(self.document)
+        metadata = {"page_count": page_count, "source": self.pdf_path}
+        backend = self._select_backend()
         
-        return pages_data
+        # Only time spent producing pages counts, not the consumer's parsing
+        elapsed = 0.0
+        started = time.perf_counter()
+        for page_number, blocks in self._produce_pages(backend, page_count):
+            elapsed += time.perf_counter() - started
+            yield {
+                "page_number": page_number,
+                "blocks": blocks,
+                "metadata": metadata
+            }
+            started = time.perf_counter()
+        elapsed += time.perf_counter() - started
+        
+        if page_count:
+            logger.info(f"Extracted {page_count} pages with {backend} at {elapsed * 1000 / page_count:.2f} ms/page")
+    
+    def extract_text_by_pages(self) -> List[Dict[str, str]]:
+        """Extract text from all pages"""
+        return [
+            {
+                "page_number": page["page_number"],
+                "content": "\n".join(page["blocks"]),
+                "metadata": page["metadata"]
+            }
+            for page in self._iter_pages()
+        ]
     
     def extract_sections(self) -> List[Dict[str, str]]:
         """Extract and structure legal sections"""
-        pages_data = self.extract_text_by_pages()
         sections = []
         
         current_section = ""
-        current_content = ""
+        current_content = []
+        last_page_number = 1
         
-        for page_data in pages_data:
-            content = page_data["content"]
-            lines = content.split('\n')
+        # Pages are parsed as they are extracted; no page list is kept
+        for page_data in self._iter_pages():
+            last_page_number = page_data["page_number"]
             
-            for line in lines:
-                line = line.strip()
-                if not line:
-                    continue
-                    
+            # Headers are detected per line: PyMuPDF blocks and pdfium lines split
+            # into the same units, so both backends yield the same sections
+            for line in _iter_lines(page_data["blocks"]):
+                
                 # Detect section headers (common patterns in legal documents)
-                if (line.startswith("Section") or 
-                    line.startswith("Article") or 
-                    line.startswith("Chapter") or
-                    line.isupper() and len(line) < 100):
+                if line.startswith(HEADER_PREFIXES) or (len(line) < 100 and line.isupper()):
                     
                     # Save previous section
                     if current_section and current_content:
                         sections.append({
                             "section_title": current_section,
-                            "content": current_content.strip(),
+                            "content": " ".join(current_content),
                             "page_number": page_data["page_number"]
                         })
                     
                     current_section = line
-                    current_content = ""
+                    current_content = []
                 else:
-                    current_content += line + " "
+                    # Joined once per section instead of re-copied per line
+                    current_content.append(line)
         
         # Add the last section
         if current_section and current_content:
             sections.append({
                 "section_title": current_section,
-                "content": current_content.strip(),
-                "page_number": pages_data[-1]["page_number"] if pages_data else 1
+                "content": " ".join(current_content),
+                "page_number": last_page_number
             })
         
         return sections
@@ -92,3 +213,11 @@ class PDFProcessor:
         """Close PDF document"""
         if self.document:
             self.document.close()
+            self.document = None
+        # The view must be released before its mapping can be closed
+        if self._buffer is not None:
+            self._buffer.release()
+            self._buffer = None
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
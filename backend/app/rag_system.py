@@ -1,43 +1,142 @@
 # Retrieval-Augmented Generation system logic
 import os
 import pickle
+import platform
+from functools import lru_cache
+from itertools import groupby
 import faiss
 import numpy as np
+import orjson
+import torch
 from sentence_transformers import SentenceTransformer
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_openai import ChatOpenAI  
 from typing import List, Dict, Tuple
 import logging
 
+from .embedding_cache import EmbeddingCache
+
 logger = logging.getLogger(__name__)
 
+# Bulk encoding settings for building the vector store
+ENCODE_BATCH_SIZE = 128
+
+# Token budget per embedded text; chunks are sized in the same tokens to fit under it
+MAX_SEQ_LENGTH = 256
+CHUNK_SIZE_TOKENS = 200
+CHUNK_OVERLAP_TOKENS = 20
+
+# Corpus sizes above which approximate indexes replace the exact flat scan
+HNSW_MIN_DOCUMENTS = 1000
+IVFPQ_MIN_DOCUMENTS = 100000
+IVFPQ_TRAINING_SAMPLE = 200000
+
+# Above this many vectors use 4096 inverted lists instead of 1024
+IVF4096_MIN_DOCUMENTS = 500000
+
+# Serve searches from GPU when enabled, available and the store is large
+FAISS_USE_GPU = os.getenv("FAISS_USE_GPU", "false").lower() == "true"
+GPU_MIN_DOCUMENTS = 100000
+
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH", "vector_store/embedding_cache.sqlite")
+
+def _as_float32(embeddings: np.ndarray) -> np.ndarray:
+    """C-contiguous float32 view of the embeddings, copying only when FAISS needs it"""
+    if embeddings.dtype != np.float32 or not embeddings.flags['C_CONTIGUOUS']:
+        return np.ascontiguousarray(embeddings, dtype=np.float32)
+    return embeddings
+
+def _cpu_flags() -> set:
+    """x86 feature flags from /proc/cpuinfo; empty where it is unavailable"""
+    try:
+        with open("/proc/cpuinfo") as f:
+            for line in f:
+                if line.startswith("flags"):
+                    return set(line.split(":", 1)[1].split())
+    except OSError:
+        pass
+    return set()
+
+def _onnx_file_for_cpu() -> str:
+    """Quantized ONNX export of all-MiniLM-L6-v2 suited to this CPU, else the portable fp32 one"""
+    machine = platform.machine().lower()
+    if machine in ("arm64", "aarch64"):
+        return "onnx/model_qint8_arm64.onnx"
+    
+    # The s8s8 AVX-512 exports can saturate and lose accuracy on CPUs without VNNI,
+    # so AVX2 hosts get the u8s8 export and unknown CPUs the unquantized model
+    flags = _cpu_flags()
+    if "avx512_vnni" in flags:
+        return "onnx/model_qint8_avx512_vnni.onnx"
+    if "avx2" in flags:
+        return "onnx/model_quint8_avx2.onnx"
+    return "onnx/model.onnx"
+
+@lru_cache(maxsize=1)
+def _get_embedder() -> Tuple[SentenceTransformer, str]:
+    """Process-wide embedding model on the fastest available backend, with its cache id"""
+    if torch.cuda.is_available():
+        # Half-precision weights halve memory traffic on GPU
+        model = SentenceTransformer('all-MiniLM-L6-v2', model_kwargs={"torch_dtype": torch.float16})
+        model.max_seq_length = MAX_SEQ_LENGTH
+        return model, "all-MiniLM-L6-v2:torch-fp16"
+    
+    # On CPU use the published ONNX export matching this CPU; EMBEDDINGS_ONNX_FILE
+    # selects another export from the model repo, e.g. onnx/model_quint8_avx2.onnx
+    onnx_file = os.getenv("EMBEDDINGS_ONNX_FILE") or _onnx_file_for_cpu()
+    model = SentenceTransformer(
+        'all-MiniLM-L6-v2',
+        backend="onnx",
+        model_kwargs={
+            "file_name": onnx_file,
+            "provider": "CPUExecutionProvider"
+        }
+    )
+    model.max_seq_length = MAX_SEQ_LENGTH
+    return model, f"all-MiniLM-L6-v2:{onnx_file}"
+
+@lru_cache(maxsize=1)
+def _get_llm() -> ChatOpenAI:
+    """Process-wide chat model client"""
+    # Prompts are ordered so the letter and arguments calls share a long prefix.
+    # OpenAI caches such prefixes automatically; a vLLM/SGLang server reached via
+    # OPENAI_BASE_URL should be started with --enable-prefix-caching.
+    return ChatOpenAI(
+        api_key=os.getenv("OPENAI_API_KEY"),
+        base_url=os.getenv("OPENAI_BASE_URL"),
+        model="gpt-4-turbo-preview",  # Changed from model_name to model
+        temperature=0.3
+    )
+
 class RAGSystem:
     def __init__(self):
-        self.embeddings_model = SentenceTransformer('all-MiniLM-L6-v2')
-        self.llm = ChatOpenAI(
-            api_key=os.getenv("OPENAI_API_KEY"),
-            model="gpt-4-turbo-preview",  # Changed from model_name to model
-            temperature=0.3
-        )
+        # Models are loaded once per process and shared by every instance
+        self.embeddings_model, self.embeddings_model_id = _get_embedder()
+        self._emb_cache = EmbeddingCache(EMBEDDING_CACHE_PATH, self.embeddings_model_id)
+        self.llm = _get_llm()
         self.vector_store = None
+        self._gpu_resources = None
         self.documents = []
-        self.text_splitter = RecursiveCharacterTextSplitter(
-            chunk_size=1000,
-            chunk_overlap=200,
-            length_function=len
+        self.text_splitter = RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+            self.embeddings_model.tokenizer,
+            chunk_size=CHUNK_SIZE_TOKENS,
+            chunk_overlap=CHUNK_OVERLAP_TOKENS
         )
     
     def process_documents(self, sections: List[Dict[str, str]]):
         """Process and chunk legal documents"""
-        all_chunks = []
+        # Split every section in one call; the section index groups chunks for their ids
+        docs = self.text_splitter.create_documents(
+            [section["content"] for section in sections],
+            metadatas=[{"section_index": i} for i in range(len(sections))]
+        )
         
-        for section in sections:
-            # Create chunks from section content
-            chunks = self.text_splitter.split_text(section["content"])
-            
-            for i, chunk in enumerate(chunks):
+        all_chunks = []
+        for section_index, section_docs in groupby(docs, key=lambda doc: doc.metadata["section_index"]):
+            section = sections[section_index]
+            for i, doc in enumerate(section_docs):
                 all_chunks.append({
-                    "content": chunk,
+                    "content": doc.page_content,
                     "section_title": section["section_title"],
                     "page_number": section["page_number"],
                     "chunk_id": f"{section['section_title']}_{i}"
@@ -55,38 +154,143 @@ class RAGSystem:
         # Extract text content for embedding
         texts = [doc["content"] for doc in self.documents]
         
-        # Generate embeddings
-        embeddings = self.embeddings_model.encode(texts)
+        # Reuse vectors for chunks embedded before by the same model
+        hashes = [EmbeddingCache.content_hash(text) for text in texts]
+        cached = self._emb_cache.get_many(hashes)
+        uncached_indices = [i for i, content_hash in enumerate(hashes) if content_hash not in cached]
+        
+        if uncached_indices:
+            # Generate embeddings in large batches; encode() sorts texts by length
+            # internally so each batch pads to similar lengths
+            new_embeddings = _as_float32(self.embeddings_model.encode(
+                [texts[i] for i in uncached_indices],
+                batch_size=ENCODE_BATCH_SIZE,
+                convert_to_numpy=True,
+                show_progress_bar=False
+            ))
+            self._emb_cache.put_many([hashes[i] for i in uncached_indices], new_embeddings)
+        
+        if len(uncached_indices) == len(texts):
+            # Fresh build: use the encoder output as-is
+            embeddings = new_embeddings
+        else:
+            embeddings = np.empty((len(texts), self.embeddings_model.get_sentence_embedding_dimension()), dtype='float32')
+            for i, content_hash in enumerate(hashes):
+                if content_hash in cached:
+                    embeddings[i] = cached[content_hash]
+            if uncached_indices:
+                embeddings[uncached_indices] = new_embeddings
+        logger.info(f"Embedded {len(uncached_indices)} chunks, {len(texts) - len(uncached_indices)} from cache")
+        
+        # Unit vectors make inner product equal cosine similarity; cached vectors
+        # are stored raw, so the assembled matrix is normalized in place
+        faiss.normalize_L2(embeddings)
         
         # Create FAISS index
-        dimension = embeddings.shape[1]
-        self.vector_store = faiss.IndexFlatL2(dimension)
-        self.vector_store.add(embeddings.astype('float32'))
+        self.vector_store = self._build_index(embeddings)
+        self.vector_store.add(embeddings)
+        self.vector_store = self._to_gpu(self.vector_store)
         
         logger.info(f"Created FAISS vector store with {len(texts)} documents")
         
+    def _build_index(self, embeddings: np.ndarray) -> faiss.Index:
+        """Pick a FAISS index for the corpus size, trained if the index type needs it"""
+        count, dimension = embeddings.shape
+        
+        if count > IVFPQ_MIN_DOCUMENTS:
+            # Inverted lists with 48-byte PQ codes (32x smaller than float32 for 384
+            # dimensions); trained on a random sample
+            nlist = 4096 if count > IVF4096_MIN_DOCUMENTS else 1024
+            index = faiss.index_factory(dimension, f"IVF{nlist},PQ48x8", faiss.METRIC_INNER_PRODUCT)
+            sample = embeddings[np.random.default_rng(0).choice(count, min(count, IVFPQ_TRAINING_SAMPLE), replace=False)]
+            index.train(sample)
+            index.nprobe = 16
+            return index
+        
+        if count > HNSW_MIN_DOCUMENTS:
+            # Graph over fp16 vectors: half the resident size of HNSWFlat
+            index = faiss.IndexHNSWSQ(dimension, faiss.ScalarQuantizer.QT_fp16, 32, faiss.METRIC_INNER_PRODUCT)
+            index.hnsw.efConstruction = 80
+            index.hnsw.efSearch = 64
+            if not index.is_trained:
+                index.train(embeddings)
+            return index
+        
+        # Small corpora: an exact scan over fp16 codes is already fast
+        return faiss.IndexScalarQuantizer(dimension, faiss.ScalarQuantizer.QT_fp16, faiss.METRIC_INNER_PRODUCT)
+    
+    def _convert_legacy_index(self, index: faiss.Index) -> faiss.Index:
+        """Rebuild an L2 index over raw vectors as an inner-product index over unit vectors"""
+        try:
+            embeddings = index.reconstruct_n(0, index.ntotal)
+        except RuntimeError as e:
+            logger.error(f"Cannot convert legacy L2 index, rebuild the vector store: {str(e)}")
+            return index
+        
+        faiss.normalize_L2(embeddings)
+        converted = self._build_index(embeddings)
+        converted.add(embeddings)
+        logger.info("Converted legacy L2 index to inner product; save the vector store to persist it")
+        return converted
+    
+    def _to_gpu(self, index: faiss.Index) -> faiss.Index:
+        """Move a large index to GPU 0 when enabled; the CPU index is kept otherwise"""
+        if not FAISS_USE_GPU or index.ntotal < GPU_MIN_DOCUMENTS or faiss.get_num_gpus() == 0:
+            return index
+        
+        try:
+            # The resources must outlive the GPU index
+            self._gpu_resources = faiss.StandardGpuResources()
+            gpu_index = faiss.index_cpu_to_gpu(self._gpu_resources, 0, index)
+            logger.info(f"Moved FAISS index with {index.ntotal} vectors to GPU")
+            return gpu_index
+        except Exception as e:
+            # e.g. HNSW has no GPU implementation
+            logger.error(f"Error moving FAISS index to GPU: {str(e)}")
+            self._gpu_resources = None
+            return index
+    
     def save_vector_store(self, path: str = "vector_store"):
         """Save vector store and documents to disk"""
         os.makedirs(path, exist_ok=True)
         
-        # Save FAISS index
-        faiss.write_index(self.vector_store, f"{path}/faiss_index")
+        # Save FAISS index; GPU indexes are written from a CPU copy
+        index = self.vector_store
+        if self._gpu_resources is not None:
+            index = faiss.index_gpu_to_cpu(index)
+        faiss.write_index(index, f"{path}/faiss_index")
         
-        # Save documents
-        with open(f"{path}/documents.pkl", "wb") as f:
-            pickle.dump(self.documents, f)
+        # Save documents as JSON; orjson serializes the flat dicts far faster than pickle
+        with open(f"{path}/documents.json", "wb") as f:
+            f.write(orjson.dumps(self.documents))
             
         logger.info(f"Vector store saved to {path}")
     
+    def _read_index(self, index_path: str) -> faiss.Index:
+        """Read a FAISS index, memory-mapping the inverted lists of IVF indexes"""
+        # The first four bytes name the index type; IVF types start with "Iw" (or "Iv" in old files)
+        with open(index_path, "rb") as f:
+            fourcc = f.read(4)
+        if fourcc[:2] in (b"Iw", b"Iv"):
+            return faiss.read_index(index_path, faiss.IO_FLAG_MMAP | faiss.IO_FLAG_READ_ONLY)
+        return faiss.read_index(index_path)
+    
     def load_vector_store(self, path: str = "vector_store"):
         """Load vector store and documents from disk"""
         try:
             # Load FAISS index
-            self.vector_store = faiss.read_index(f"{path}/faiss_index")
+            self.vector_store = self._read_index(f"{path}/faiss_index")
+            if self.vector_store.metric_type == faiss.METRIC_L2:
+                self.vector_store = self._convert_legacy_index(self.vector_store)
+            self.vector_store = self._to_gpu(self.vector_store)
             
-            # Load documents
-            with open(f"{path}/documents.pkl", "rb") as f:
-                self.documents = pickle.load(f)
+            # Load documents; stores saved before the JSON format only have the pickle
+            if os.path.exists(f"{path}/documents.json"):
+                with open(f"{path}/documents.json", "rb") as f:
+                    self.documents = orjson.loads(f.read())
+            else:
+                with open(f"{path}/documents.pkl", "rb") as f:
+                    self.documents = pickle.load(f)
                 
             logger.info(f"Vector store loaded from {path}")
             return True
@@ -94,31 +298,38 @@ class RAGSystem:
             logger.error(f"Error loading vector store: {str(e)}")
             return False
     
-    def similarity_search(self, query: str, k: int = 5) -> List[Dict]:
+    def embed_query(self, query: str) -> np.ndarray:
+        """Generate a unit-length embedding for a single query"""
+        return self.embeddings_model.encode([query], normalize_embeddings=True)
+    
+    def similarity_search(self, query: str, k: int = 5, query_embedding: np.ndarray = None) -> List[Dict]:
         """Search for similar documents"""
         if not self.vector_store:
             raise ValueError("Vector store not initialized")
         
         # Generate query embedding
-        query_embedding = self.embeddings_model.encode([query])
+        if query_embedding is None:
+            query_embedding = self.embed_query(query)
         
         # Search similar documents
         distances, indices = self.vector_store.search(
-            query_embedding.astype('float32'), k
+            _as_float32(query_embedding), k
         )
         
         # Return relevant documents
         results = []
         for i, idx in enumerate(indices[0]):
-            if idx < len(self.documents):
+            # Approximate indexes pad missing results with -1
+            if 0 <= idx < len(self.documents):
                 doc = self.documents[idx].copy()
+                # Cosine similarity: higher is more relevant
                 doc["similarity_score"] = float(distances[0][i])
                 results.append(doc)
         
         return results
     
-    def generate_response(self, query: str, context_docs: List[Dict]) -> str:
-        """Generate response using LLM with context"""
+    def _build_prompt(self, query: str, context_docs: List[Dict]) -> str:
+        """Build LLM prompt with context"""
         context = "\n\n".join([
             f"Section: {doc['section_title']}\nContent: {doc['content']}"
             for doc in context_docs
@@ -135,9 +346,26 @@ class RAGSystem:
         Please provide a comprehensive legal analysis based on the provided context.
         """
         
+        return prompt
+    
+    def generate_response(self, query: str, context_docs: List[Dict]) -> str:
+        """Generate response using LLM with context"""
+        prompt = self._build_prompt(query, context_docs)
+        
         try:
             response = self.llm.invoke(prompt)
             return response
         except Exception as e:
             logger.error(f"Error generating LLM response: {str(e)}")
             return "Error generating response"
+    
+    async def agenerate_response(self, query: str, context_docs: List[Dict]) -> str:
+        """Generate response using LLM with context without blocking the event loop"""
+        prompt = self._build_prompt(query, context_docs)
+        
+        try:
+            response = await self.llm.ainvoke(prompt)
+            return response
+        except Exception as e:
+            logger.error(f"Error generating LLM response: {str(e)}")
+            return "Error generating response"
@@ -0,0 +1,130 @@
+# cython: language_level=3, boundscheck=False, wraparound=False
+# Compiled markdown-to-HTML formatter for letter exports.
+#
+# Mirrors the single-pass regex in letter_generator._process_text_formatting
+# (bold, italic, section headers, numbered points, then paragraphs) as a
+# character scanner. Build in place from backend/ with:
+#
+#     cythonize -i app/text_formatting.pyx
+#
+# letter_generator falls back to the regex path when the extension is not built.
+
+cdef inline bint _is_upper(Py_UCS4 ch):
+    return u'A' <= ch <= u'Z'
+
+cdef inline bint _at_line_start(str text, Py_ssize_t i):
+    return i == 0 or text[i - 1] == u'\n'
+
+cdef Py_ssize_t _match_bold(str text, Py_ssize_t i, Py_ssize_t n):
+    """End of a **bold** token starting at i, or -1"""
+    cdef Py_ssize_t j
+    if i + 1 >= n or text[i] != u'*' or text[i + 1] != u'*':
+        return -1
+    j = i + 2
+    while j + 1 < n:
+        if text[j] == u'\n':
+            return -1
+        if text[j] == u'*' and text[j + 1] == u'*':
+            return j + 2
+        j += 1
+    return -1
+
+cdef Py_ssize_t _match_italic(str text, Py_ssize_t i, Py_ssize_t n):
+    """End of an *italic* token starting at i, or -1"""
+    cdef Py_ssize_t k
+    if text[i] != u'*' or (i > 0 and text[i - 1] == u'*'):
+        return -1
+    if i + 1 >= n or text[i + 1] == u'*':
+        return -1
+    k = i + 1
+    while k < n and text[k] != u'*':
+        k += 1
+    if k >= n or (k + 1 < n and text[k + 1] == u'*'):
+        return -1
+    return k + 1
+
+cdef Py_ssize_t _match_header(str text, Py_ssize_t i, Py_ssize_t n):
+    """End of an uppercase `HEADER:` token starting at line start i, or -1"""
+    cdef Py_ssize_t k
+    cdef Py_UCS4 ch
+    if not _is_upper(text[i]):
+        return -1
+    k = i + 1
+    while k < n:
+        ch = text[k]
+        if not (_is_upper(ch) or ch.isspace()):
+            break
+        k += 1
+    if k == i + 1 or k >= n or text[k] != u':':
+        return -1
+    return k + 1
+
+cdef Py_ssize_t _match_numbered(str text, Py_ssize_t i, Py_ssize_t n):
+    """End of a `1. ` token starting at line start i, or -1"""
+    cdef Py_ssize_t k = i
+    while k < n and text[k].isdecimal():
+        k += 1
+    if k == i or k + 1 >= n or text[k] != u'.' or not text[k + 1].isspace():
+        return -1
+    return k + 2
+
+cdef str _format_italics(str text):
+    """Render *italic* tokens only, as used inside bold text"""
+    cdef Py_ssize_t n = len(text)
+    cdef Py_ssize_t i = 0, start = 0, end
+    cdef list out = []
+    while i < n:
+        if text[i] == u'*':
+            end = _match_italic(text, i, n)
+            if end != -1:
+                out.append(text[start:i])
+                out.append(u'<em>' + text[i + 1:end - 1] + u'</em>')
+                i = start = end
+                continue
+        i += 1
+    out.append(text[start:])
+    return u''.join(out)
+
+cdef str _format_inline(str text):
+    """Render bold, italic, header and numbered-point tokens in one scan"""
+    cdef Py_ssize_t n = len(text)
+    cdef Py_ssize_t i = 0, start = 0, end
+    cdef Py_UCS4 ch
+    cdef list out = []
+    while i < n:
+        ch = text[i]
+        end = -1
+        if ch == u'*':
+            end = _match_bold(text, i, n)
+            if end != -1:
+                out.append(text[start:i])
+                out.append(u'<strong>' + _format_italics(text[i + 2:end - 2]) + u'</strong>')
+                i = start = end
+                continue
+            end = _match_italic(text, i, n)
+            if end != -1:
+                out.append(text[start:i])
+                out.append(u'<em>' + text[i + 1:end - 1] + u'</em>')
+                i = start = end
+                continue
+        elif _at_line_start(text, i):
+            end = _match_header(text, i, n)
+            if end != -1:
+                out.append(text[start:i])
+                out.append(u'<div class="section-header">' + text[i:end] + u'</div>')
+                i = start = end
+                continue
+            end = _match_numbered(text, i, n)
+            if end != -1:
+                out.append(text[start:i])
+                out.append(u'<strong>' + text[i:end] + u'</strong>')
+                i = start = end
+                continue
+        i += 1
+    out.append(text[start:])
+    return u''.join(out)
+
+cpdef str format_text(str text):
+    """Process markdown-style formatting for professional legal document"""
+    text = _format_inline(text)
+    return u'\n'.join([u'<p>' + p.strip() + u'</p>' for p in text.split(u'\n\n') if p.strip()])
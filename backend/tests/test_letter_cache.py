@@ -0,0 +1,65 @@
+# Letter cache must never serve one client's letter to another
+import asyncio
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("faiss")
+pytest.importorskip("sentence_transformers")
+
+from app import letter_generator
+from app.letter_generator import LegalLetterGenerator
+
+CASE = {
+    "case_title": "Unpaid salary",
+    "incident_summary": "Salary for three months was withheld by the employer.",
+    "tags": ["Unpaid Wages"],
+    "client_name": "Client A",
+    "advocate_name": "Advocate X",
+    "law_firm_name": "Firm Y",
+    "recipient_name": "HR Manager",
+    "recipient_organization": "Acme Ltd"
+}
+
+class FakeEmbeddings:
+    def get_sentence_embedding_dimension(self):
+        return 4
+
+class FakeRAG:
+    """Embeds every query identically and echoes the prompt's client name"""
+
+    def __init__(self):
+        self.embeddings_model = FakeEmbeddings()
+        self.generations = 0
+
+    def embed_query(self, query):
+        return np.array([[1.0, 0.0, 0.0, 0.0]], dtype="float32")
+
+    def similarity_search(self, query, k=5, query_embedding=None):
+        return []
+
+    async def agenerate_response(self, query, context_docs):
+        self.generations += 1
+        client = next(line for line in query.splitlines() if "Client Name:" in line)
+        return client.strip()
+
+@pytest.fixture
+def generator(monkeypatch):
+    monkeypatch.setattr(letter_generator, "CrossEncoder", lambda name: None)
+    return LegalLetterGenerator(FakeRAG())
+
+def test_cases_differing_only_in_client_are_generated_fresh(generator):
+    first = asyncio.run(generator.generate_formal_letter(dict(CASE)))
+    second = asyncio.run(generator.generate_formal_letter({**CASE, "client_name": "Client B"}))
+
+    assert first["formal_letter"] == "Client Name: Client A"
+    assert second["formal_letter"] == "Client Name: Client B"
+    assert generator.rag_system.generations == 4
+    assert generator.cache.hits == 0
+
+def test_identical_case_is_served_from_cache(generator):
+    asyncio.run(generator.generate_formal_letter(dict(CASE)))
+    cached = asyncio.run(generator.generate_formal_letter(dict(CASE)))
+
+    assert cached["formal_letter"] == "Client Name: Client A"
+    assert generator.rag_system.generations == 2
+    assert generator.cache.hits == 1
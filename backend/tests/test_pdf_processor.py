@@ -0,0 +1,48 @@
+# Section extraction must not depend on the PDF backend
+import pytest
+
+fitz = pytest.importorskip("fitz")
+pytest.importorskip("pypdfium2")
+
+from app import pdf_processor
+from app.pdf_processor import PDFProcessor
+
+PAGES = [
+    ["CHAPTER I", "INTRODUCTION", "Section 1. Title and extent of operation of the Code.",
+     "This Code shall be called the Indian Penal Code,", "and shall extend to the whole of India."],
+    ["Section 2. Punishment of offences committed within India.",
+     "Every person shall be liable to punishment under this Code", "and not otherwise for every act or omission.",
+     "Article 3. Punishment of offences committed beyond India.",
+     "Any person liable by law to be tried for an offence committed beyond India."]
+]
+
+@pytest.fixture
+def pdf_path(tmp_path):
+    path = tmp_path / "legal.pdf"
+    document = fitz.open()
+    for lines in PAGES:
+        page = document.new_page()
+        for i, line in enumerate(lines):
+            page.insert_text((72, 72 + 24 * i), line, fontsize=11)
+    document.save(path)
+    document.close()
+    return str(path)
+
+def extract_sections(pdf_path, backend, monkeypatch):
+    monkeypatch.setattr(pdf_processor, "PDF_BACKEND", backend)
+    processor = PDFProcessor(pdf_path)
+    try:
+        return processor.extract_sections()
+    finally:
+        processor.close()
+
+def test_backends_yield_identical_sections(pdf_path, monkeypatch):
+    pymupdf_sections = extract_sections(pdf_path, "pymupdf", monkeypatch)
+    pdfium_sections = extract_sections(pdf_path, "pdfium", monkeypatch)
+
+    assert [section["section_title"] for section in pymupdf_sections] == [
+        "Section 1. Title and extent of operation of the Code.",
+        "Section 2. Punishment of offences committed within India.",
+        "Article 3. Punishment of offences committed beyond India."
+    ]
+    assert pdfium_sections == pymupdf_sections
@@ -1,6 +1,11 @@
 # Streamlit component for PDF export
+import queue
+import subprocess
+import tempfile
+import threading
+import time
+from pathlib import Path
 import streamlit as st
-import base64
 
 def export_to_pdf(html_content, filename):
     """Export HTML content to PDF"""
@@ -9,19 +14,20 @@ def export_to_pdf(html_content, filename):
         # For this implementation, we'll provide HTML download
         # Full PDF generation would require additional libraries like weasyprint
         
-        b64 = base64.b64encode(html_content.encode()).decode()
-        href = f'<a href="data:text/html;base64,{b64}" download="{filename}.html">Download HTML File</a>'
-        
-        st.markdown(href, unsafe_allow_html=True)
+        # Streamlit serves the bytes itself; no base64 data URL in the page
+        st.download_button(
+            label="Download HTML File",
+            data=html_content.encode('utf-8'),
+            file_name=f"{filename}.html",
+            mime="text/html"
+        )
         st.info("HTML file ready for download. Convert to PDF using your preferred tool.")
         
     except Exception as e:
         st.error(f"Export error: {str(e)}")
 
-def create_pdf_preview(letter_content, case_data):
-    """Create PDF preview HTML"""
-    
-    html_template = f"""
+# Preview page shell; only the case fields are filled in per call
+_HTML_SHELL = """
     <!DOCTYPE html>
     <html>
     <head>
@@ -35,23 +41,113 @@ def create_pdf_preview(letter_content, case_data):
     <body>
         <div class="header">
             <h1>LEGAL NOTICE</h1>
-            <p><strong>{case_data.get('advocate_name', '')}</strong></p>
+            <p><strong>{header_name}</strong></p>
         </div>
         
         <div class="content">
-            <h2>{case_data.get('case_title', '')}</h2>
-            {letter_content.get('formal_letter', '')}
+            <h2>{case_title}</h2>
+            {formal}
             
             <h3>Legal Arguments:</h3>
-            {letter_content.get('legal_arguments', '')}
+            {arguments}
         </div>
         
         <div class="signature">
             <p>Sincerely,<br><br>
-            <strong>{case_data.get('advocate_name', '')}</strong></p>
+            <strong>{signature}</strong></p>
         </div>
     </body>
     </html>
     """
+
+@st.cache_data(show_spinner=False)
+def create_pdf_preview(letter_content, case_data):
+    """Create PDF preview HTML"""
+    return _HTML_SHELL.format_map({
+        "header_name": case_data.get('advocate_name', ''),
+        "case_title": case_data.get('case_title', ''),
+        "formal": letter_content.get('formal_letter', ''),
+        "arguments": letter_content.get('legal_arguments', ''),
+        "signature": case_data.get('advocate_name', '')
+    })
+
+class PdfWorker:
+    """Long-running wkhtmltopdf process that converts one document per stdin line"""
+    
+    def __init__(self, wkhtmltopdf_path, timeout=60, options=None):
+        self.wkhtmltopdf_path = wkhtmltopdf_path
+        self.timeout = timeout
+        # pdfkit-style options; "quiet" is dropped since completion is read from the progress output
+        options = {"encoding": "utf-8", **(options or {})}
+        self.args = " ".join(
+            f"--{key} {value}" if value else f"--{key}" for key, value in options.items() if key != "quiet"
+        )
+        self.process = None
+        self.lines = None
+        self.lock = threading.Lock()
+    
+    def _start(self):
+        """Start wkhtmltopdf and a thread that forwards its progress output"""
+        self.process = subprocess.Popen(
+            [self.wkhtmltopdf_path, "--read-args-from-stdin"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+            text=True,
+            bufsize=1
+        )
+        self.lines = queue.Queue()
+        threading.Thread(target=self._read_output, args=(self.process.stderr, self.lines), daemon=True).start()
+    
+    @staticmethod
+    def _read_output(stream, lines):
+        """Queue stderr lines; None marks process exit"""
+        for line in stream:
+            lines.put(line)
+        lines.put(None)
+    
+    def _convert(self, html_documents):
+        if self.process is None or self.process.poll() is not None:
+            self._start()
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            sources = []
+            for i, html_content in enumerate(html_documents):
+                source = Path(tmp_dir, f"document_{i}.html")
+                source.write_text(html_content, encoding="utf-8")
+                sources.append(f'"{source.as_posix()}"')
+            target = Path(tmp_dir, "document.pdf")
+            
+            # One conversion per line: options, input files, output file
+            self.process.stdin.write(f'{self.args} {" ".join(sources)} "{target.as_posix()}"\n')
+            self.process.stdin.flush()
+            
+            # wkhtmltopdf reports "Done" on stderr once the document is written
+            deadline = time.monotonic() + self.timeout
+            while True:
+                line = self.lines.get(timeout=max(0.0, deadline - time.monotonic()))
+                if line is None:
+                    raise RuntimeError("wkhtmltopdf exited")
+                if line.strip().startswith("Done") or "Exit with code" in line:
+                    break
+            
+            if not target.exists() or target.stat().st_size == 0:
+                raise RuntimeError("wkhtmltopdf produced no output")
+            return target.read_bytes()
+    
+    def convert(self, *html_documents):
+        """Convert HTML documents to one PDF, each starting on a new page; None if the worker failed"""
+        with self.lock:
+            try:
+                return self._convert(html_documents)
+            except Exception:
+                # Restart on the next call
+                self.close()
+                return None
     
-    return html_template
+    def close(self):
+        """Stop the wkhtmltopdf process"""
+        if self.process is not None:
+            if self.process.poll() is None:
+                self.process.kill()
+            self.process = None
@@ -1,17 +1,46 @@
 # Streamlit app entry point
+import hashlib
+import html
+import io
+import math
 import os
+import string
 import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
 import pdfkit
 import streamlit as st
+from streamlit.runtime.scriptrunner import add_script_run_ctx, get_script_run_ctx
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import json
+import orjson
 from datetime import datetime
 import base64
 import pandas as pd
 
+from components.pdf_export import PdfWorker
+
 wkhtmltopdf_path = r"D:\download_folder\wkhtmltox-0.12.6-1.mxe-cross-win64\wkhtmltox\bin\wkhtmltopdf.exe"
 config = pdfkit.configuration(wkhtmltopdf=wkhtmltopdf_path)
 
+# Export HTML is static and self-contained: no scripts, images or links to follow
+PDF_OPTS = {
+    "disable-javascript": "",
+    "no-images": "",
+    "disable-external-links": "",
+    "disable-internal-links": "",
+    "load-error-handling": "ignore",
+    "quiet": "",
+    "encoding": "UTF-8"
+}
+
+@st.cache_resource
+def _pdf_worker():
+    """wkhtmltopdf process kept alive across exports and reruns"""
+    return PdfWorker(wkhtmltopdf_path, options=PDF_OPTS)
+
 # Configure Streamlit page
 st.set_page_config(
     page_title="Legal Letter Generator",
@@ -23,8 +52,50 @@ st.set_page_config(
 # API Configuration
 API_BASE_URL = "http://localhost:9000"  # Changed from port 9000 to 9000
 
-# Custom CSS
-st.markdown("""
+# Case cards rendered per home page view
+CASES_PER_PAGE = 20
+
+# Cases requested per /cases call when loading the full listing
+CASES_FETCH_LIMIT = 500
+
+# Wrapper for letter and argument bodies shown in the app
+_LEGAL_TMPL = string.Template('<div class="legal-text">$body</div>')
+
+# Bytes read per chunk when downloading export HTML
+EXPORT_CHUNK_SIZE = 1 << 16
+
+# Case fields the analytics page reads
+ANALYTICS_COLUMNS = ['case_title', 'client_name', 'advocate_name', 'tags', 'created_at']
+
+@st.cache_resource
+def _http_session():
+    """Keep-alive session shared by every rerun and browser session"""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=8, max_retries=Retry(total=2, backoff_factor=0.2))
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    return session
+
+# Streamlit re-executes this module on every rerun; the cached session survives it
+SESSION = _http_session()
+
+@st.cache_resource
+def _executor():
+    """Worker threads for fanning out independent backend calls"""
+    return ThreadPoolExecutor(max_workers=4)
+
+def _submit(fn, *args):
+    """Run fn on a worker thread with this script run's context attached"""
+    ctx = get_script_run_ctx()
+    
+    def run():
+        add_script_run_ctx(threading.current_thread(), ctx)
+        return fn(*args)
+    
+    return _executor().submit(run)
+
+# Custom CSS; Streamlit drops any element a rerun does not emit, so it is sent on every run
+_CSS = """
 <style>
     .main-header {
         font-size: 2.5rem;
@@ -52,8 +123,17 @@ st.markdown("""
         line-height: 1.6;
         text-align: justify;
     }
+    .case-grid {
+        display: grid;
+        grid-template-columns: repeat(3, 1fr);
+        gap: 1rem;
+    }
+    .case-grid-2 {
+        grid-template-columns: repeat(2, 1fr);
+    }
 </style>
-""", unsafe_allow_html=True)
+"""
+st.markdown(_CSS, unsafe_allow_html=True)
 
 def initialize_session_state():
     """Initialize session state variables"""
@@ -64,22 +144,68 @@ def initialize_session_state():
     if 'cases_history' not in st.session_state:
         st.session_state.cases_history = []
 
+def _json(response):
+    """Decode a JSON response body with orjson"""
+    return orjson.loads(response.content)
+
+@st.cache_data(ttl=60, show_spinner=False)
+def _api_health():
+    """Backend health payload; failures raise, so only successes are cached"""
+    response = SESSION.get(f"{API_BASE_URL}/health", timeout=5)
+    response.raise_for_status()
+    return _json(response)
+
+@st.cache_data(ttl=30, show_spinner=False)
+def _api_cases():
+    """Every case summary (no letter bodies); failures raise, so only successes are cached"""
+    # The backend caps each listing, so page through it until a short page
+    cases = []
+    while True:
+        response = SESSION.get(
+            f"{API_BASE_URL}/cases",
+            params={"fields": "summary", "limit": CASES_FETCH_LIMIT, "skip": len(cases)},
+            timeout=10
+        )
+        response.raise_for_status()
+        batch = _json(response).get("cases", [])
+        cases.extend(batch)
+        if len(batch) < CASES_FETCH_LIMIT:
+            return cases
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _api_case_letter(case_id):
+    """Letter and arguments for one case, fetched when first viewed"""
+    response = SESSION.get(f"{API_BASE_URL}/cases/{case_id}/letter", timeout=10)
+    response.raise_for_status()
+    return _json(response)
+
+def _get_cases():
+    """Cases for this rerun, from the fetch started at the top of main()"""
+    future = st.session_state.get("cases_future")
+    return future.result() if future is not None else _api_cases()
+
 def check_api_health():
-    """Check if backend API is running"""
+    """Check if backend API is running; returns (ok, health payload)"""
     try:
-        response = requests.get(f"{API_BASE_URL}/health", timeout=5)
-        return response.status_code == 200
+        payload = _api_health()
     except:
-        return False
+        payload = None
+    # The sidebar status reads the same payload instead of checking again
+    st.session_state.health = payload
+    return payload is not None, payload
 
 def main():
     initialize_session_state()
     
+    # Fetch cases while the health check runs; every page in this rerun shares the result
+    st.session_state.cases_future = _submit(_api_cases)
+    
     # Header
     st.markdown('<h1 class="main-header">⚖️ Legal Letter Generator</h1>', unsafe_allow_html=True)
     
     # Check API health
-    if not check_api_health():
+    api_ok, _ = check_api_health()
+    if not api_ok:
         st.error("🚨 Backend API is not available. Please ensure the FastAPI server is running on port 9000.")
         st.info("To start the backend server, run: `uvicorn app.main:app --reload --port 9000`")
         return
@@ -97,7 +223,7 @@ def main():
         # API Status
         st.subheader("System Status")
         try:
-            health_response = requests.get(f"{API_BASE_URL}/health", timeout=5).json()
+            health_response = st.session_state.health
             
             if health_response.get("rag_system_ready"):
                 st.success("✅ RAG System Ready")
@@ -121,6 +247,89 @@ def main():
     elif page == "📊 Analytics":
         render_analytics_page()
 
+@st.cache_data(show_spinner=False)
+def _format_case_html(case, formatted_date, formatted_time, tags_display):
+    """Render a home page case card body as one escaped HTML block"""
+    def field(key, default='N/A'):
+        return html.escape(str(case.get(key, default)))
+    
+    supporting_sections = case.get('supporting_sections', [])
+    if supporting_sections:
+        legal_status = f"<p><strong>Legal References:</strong> {len(supporting_sections)} sections</p>" + "".join(
+            f"<p>{j}. {html.escape(section)}</p>" for j, section in enumerate(supporting_sections[:3], 1)
+        )
+        if len(supporting_sections) > 3:
+            legal_status += f"<p>... and {len(supporting_sections) - 3} more sections</p>"
+    else:
+        legal_status = "<p><strong>Legal References:</strong> Not available</p>"
+    
+    return f"""
+<div class="case-grid">
+    <div>
+        <p><strong>📋 Case Information</strong></p>
+        <p><strong>Title:</strong> {field('case_title', 'Untitled Case')}</p>
+        <p><strong>Case ID:</strong> {field('_id')}</p>
+        <p><strong>Tags:</strong> {html.escape(tags_display)}</p>
+        <p><strong>Created:</strong> {html.escape(formatted_date)}</p>
+        <p><strong>Time:</strong> {html.escape(formatted_time)}</p>
+    </div>
+    <div>
+        <p><strong>👤 People Involved</strong></p>
+        <p><strong>Client:</strong> {field('client_name')}</p>
+        <p><strong>Advocate:</strong> {field('advocate_name')}</p>
+        <p><strong>Law Firm:</strong> {field('law_firm_name')}</p>
+        <p><strong>Against:</strong> {field('recipient_organization')}</p>
+    </div>
+    <div>
+        <p><strong>📞 Contact Details</strong></p>
+        <p><strong>Phone:</strong> {field('law_firm_phone')}</p>
+        <p><strong>Email:</strong> {field('law_firm_email')}</p>
+        <p><strong>Address:</strong> {field('law_firm_address')}</p>
+        <p><strong>City:</strong> {field('law_firm_city')}</p>
+    </div>
+</div>
+<hr>
+<p><strong>📝 Case Summary</strong></p>
+<p>{field('incident_summary', 'No summary available')}</p>
+<hr>
+<div class="case-grid case-grid-2">
+    <div>
+        <p><strong>📨 Recipient Details</strong></p>
+        <p><strong>Name:</strong> {field('recipient_name')}</p>
+        <p><strong>Organization:</strong> {field('recipient_organization')}</p>
+        <p><strong>Address:</strong> {field('recipient_address')}</p>
+        <p><strong>Location:</strong> {field('recipient_city')}, {field('recipient_state')}</p>
+    </div>
+    <div>
+        <p><strong>⚖️ Legal Status</strong></p>
+        {legal_status}
+    </div>
+</div>
+<hr>
+"""
+
+@st.cache_data(ttl=3600, max_entries=64, show_spinner=False)
+def _render_legal_html(case_id, field, default):
+    """Letter panel HTML for one case body, keyed by case id instead of the body text"""
+    return _LEGAL_TMPL.substitute(body=_api_case_letter(case_id).get(field, default))
+
+def _toggle_export_selection(case_id):
+    """Checkbox callback: record a case's combined-export selection outside widget state"""
+    # Widget state of cards on other pages is discarded, so the selection lives in a plain set
+    selected = st.session_state.setdefault('export_selection', set())
+    if st.session_state[f"sel_{case_id}"]:
+        selected.add(case_id)
+    else:
+        selected.discard(case_id)
+
+def _select_case(state_key, case_id):
+    """Button callback: show a case's letter or arguments panel"""
+    st.session_state[state_key] = case_id
+
+def _clear_selection(state_key):
+    """Button callback: close a case's letter or arguments panel"""
+    st.session_state.pop(state_key, None)
+
 def render_home_page():
     """Render home page with all case details in proper format"""
     st.header("Welcome to Legal Letter Generator")
@@ -145,174 +354,96 @@ def render_home_page():
     st.subheader("📈 All Legal Cases")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/cases", timeout=10)
-        
-        if response.status_code == 200:
-            data = response.json()
-            cases = data.get("cases", [])
+        cases = _get_cases()
+        
+        if cases and len(cases) > 0:
+            # Sort cases by creation date (newest first)
+            df = pd.DataFrame(cases).reindex(columns=["created_at", "tags"])
+            df["created"] = pd.to_datetime(df["created_at"], format="ISO8601", errors="coerce")
+            df = df.sort_values("created", ascending=False, na_position="last")
+            sorted_cases = [cases[i] for i in df.index]
             
-            if cases and len(cases) > 0:
-                # Sort cases by creation date (newest first)
-                sorted_cases = sorted(cases, key=lambda x: x.get("created_at", ""), reverse=True)
-                
-                st.success(f"📊 Total Cases: **{len(sorted_cases)}**")
+            st.success(f"📊 Total Cases: **{len(sorted_cases)}**")
+            
+            # Only one page of cards (and their widgets) is built per rerun
+            page_count = math.ceil(len(sorted_cases) / CASES_PER_PAGE)
+            page = st.number_input("Page", min_value=1, max_value=page_count, value=1, step=1, key="home_page_number")
+            start = (page - 1) * CASES_PER_PAGE
+            
+            # Dates and tags for the visible page, formatted column-wise
+            visible = df.iloc[start:start + CASES_PER_PAGE]
+            formatted_dates = visible["created"].dt.strftime("%Y-%m-%d").fillna("N/A")
+            formatted_times = visible["created"].dt.strftime("%H:%M:%S").fillna("N/A")
+            tags_displays = visible["tags"].map(lambda tags: ", ".join(tags) if isinstance(tags, list) and tags else "No tags")
+            
+            # Display each case in detailed format
+            export_selection = st.session_state.setdefault('export_selection', set())
+            for i, case, formatted_date, formatted_time, tags_display in zip(
+                range(start + 1, start + CASES_PER_PAGE + 1), sorted_cases[start:start + CASES_PER_PAGE],
+                formatted_dates, formatted_times, tags_displays
+            ):
+                case_title = case.get('case_title', 'Untitled Case')
+                case_id = case.get('_id', 'N/A')
                 
-                # Display each case in detailed format
-                for i, case in enumerate(sorted_cases, 1):
-                    # Extract case details
-                    case_title = case.get('case_title', 'Untitled Case')
-                    client_name = case.get('client_name', 'N/A')
-                    advocate_name = case.get('advocate_name', 'N/A')
-                    law_firm_name = case.get('law_firm_name', 'N/A')
-                    recipient_organization = case.get('recipient_organization', 'N/A')
-                    tags = case.get('tags', [])
-                    created_at = case.get('created_at', 'N/A')
-                    case_id = case.get('_id', 'N/A')
-                    
-                    # Format date
-                    if created_at != 'N/A':
-                        try:
-                            if 'T' in str(created_at):
-                                formatted_date = str(created_at).split('T')[0]
-                                formatted_time = str(created_at).split('T')[1][:8]
-                            else:
-                                formatted_date = str(created_at)[:10]
-                                formatted_time = "00:00:00"
-                        except:
-                            formatted_date = str(created_at)[:10]
-                            formatted_time = "00:00:00"
-                    else:
-                        formatted_date = 'N/A'
-                        formatted_time = 'N/A'
+                # Create expandable case card
+                with st.expander(f"📁 Case #{i}: {case_title}", expanded=False):
                     
-                    # Format tags
-                    tags_display = ", ".join(tags) if tags else "No tags"
+                    # The card body is a single element; only the buttons are widgets
+                    st.markdown(_format_case_html(case, formatted_date, formatted_time, tags_display), unsafe_allow_html=True)
                     
-                    # Create expandable case card
-                    with st.expander(f"📁 Case #{i}: {case_title}", expanded=False):
-                        
-                        # Case overview in columns
-                        col1, col2, col3 = st.columns(3)
-                        
-                        with col1:
-                            st.markdown("**📋 Case Information**")
-                            st.write(f"**Title:** {case_title}")
-                            st.write(f"**Case ID:** {case_id}")
-                            st.write(f"**Tags:** {tags_display}")
-                            st.write(f"**Created:** {formatted_date}")
-                            st.write(f"**Time:** {formatted_time}")
-                        
-                        with col2:
-                            st.markdown("**👤 People Involved**")
-                            st.write(f"**Client:** {client_name}")
-                            st.write(f"**Advocate:** {advocate_name}")
-                            st.write(f"**Law Firm:** {law_firm_name}")
-                            st.write(f"**Against:** {recipient_organization}")
-                        
-                        with col3:
-                            st.markdown("**📞 Contact Details**")
-                            law_firm_phone = case.get('law_firm_phone', 'N/A')
-                            law_firm_email = case.get('law_firm_email', 'N/A')
-                            law_firm_address = case.get('law_firm_address', 'N/A')
-                            law_firm_city = case.get('law_firm_city', 'N/A')
-                            
-                            st.write(f"**Phone:** {law_firm_phone}")
-                            st.write(f"**Email:** {law_firm_email}")
-                            st.write(f"**Address:** {law_firm_address}")
-                            st.write(f"**City:** {law_firm_city}")
-                        
-                        st.divider()
-                        
-                        # Case summary
-                        incident_summary = case.get('incident_summary', 'No summary available')
-                        st.markdown("**📝 Case Summary**")
-                        st.write(incident_summary)
-                        
-                        st.divider()
-                        
-                        # Recipient details
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            st.markdown("**📨 Recipient Details**")
-                            recipient_name = case.get('recipient_name', 'N/A')
-                            recipient_address = case.get('recipient_address', 'N/A')
-                            recipient_city = case.get('recipient_city', 'N/A')
-                            recipient_state = case.get('recipient_state', 'N/A')
-                            
-                            st.write(f"**Name:** {recipient_name}")
-                            st.write(f"**Organization:** {recipient_organization}")
-                            st.write(f"**Address:** {recipient_address}")
-                            st.write(f"**Location:** {recipient_city}, {recipient_state}")
-                        
-                        with col2:
-                            st.markdown("**⚖️ Legal Status**")
-                            supporting_sections = case.get('supporting_sections', [])
-                            if supporting_sections:
-                                st.write(f"**Legal References:** {len(supporting_sections)} sections")
-                                for j, section in enumerate(supporting_sections[:3], 1):
-                                    st.write(f"{j}. {section}")
-                                if len(supporting_sections) > 3:
-                                    st.write(f"... and {len(supporting_sections) - 3} more sections")
-                            else:
-                                st.write("**Legal References:** Not available")
-                        
-                        # Action buttons
-                        st.divider()
-                        action_col1, action_col2, action_col3 = st.columns(3)
-                        
-                        with action_col1:
-                            if st.button(f"📄 View Letter", key=f"view_letter_{case_id}"):
-                                st.session_state.selected_case_for_view = case
-                                st.rerun()
-                        
-                        with action_col2:
-                            if st.button(f"💾 Export PDF", key=f"export_pdf_{case_id}"):
-                                export_case_pdf(case_id)
-                        
-                        with action_col3:
-                            if st.button(f"📊 View Arguments", key=f"view_args_{case_id}"):
-                                st.session_state.selected_case_for_args = case
-                                st.rerun()
-                
-                # Show selected case details if any button was clicked
-                if 'selected_case_for_view' in st.session_state:
-                    st.markdown("---")
-                    st.subheader("📄 Selected Case Letter")
-                    selected_case = st.session_state.selected_case_for_view
+                    st.checkbox("Select for combined export", key=f"sel_{case_id}", value=case_id in export_selection,
+                                on_change=_toggle_export_selection, args=(case_id,))
                     
-                    formal_letter = selected_case.get('formal_letter', 'Letter not available')
-                    st.markdown(f'<div class="legal-text">{formal_letter}</div>', unsafe_allow_html=True)
+                    # Action buttons
+                    action_col1, action_col2, action_col3 = st.columns(3)
                     
-                    if st.button("❌ Close Letter View"):
-                        del st.session_state.selected_case_for_view
-                        st.rerun()
-                
-                if 'selected_case_for_args' in st.session_state:
-                    st.markdown("---")
-                    st.subheader("📊 Selected Case Arguments")
-                    selected_case = st.session_state.selected_case_for_args
+                    with action_col1:
+                        st.button(f"📄 View Letter", key=f"view_letter_{case_id}",
+                                  on_click=_select_case, args=("selected_case_for_view", case_id))
                     
-                    legal_arguments = selected_case.get('legal_arguments', 'Arguments not available')
-                    st.markdown(f'<div class="legal-text">{legal_arguments}</div>', unsafe_allow_html=True)
+                    with action_col2:
+                        if st.button(f"💾 Export PDF", key=f"export_pdf_{case_id}"):
+                            export_case_pdf(case_id, "legal", case_title, case.get('updated_at') or case.get('created_at'))
                     
-                    if st.button("❌ Close Arguments View"):
-                        del st.session_state.selected_case_for_args
-                        st.rerun()
+                    with action_col3:
+                        st.button(f"📊 View Arguments", key=f"view_args_{case_id}",
+                                  on_click=_select_case, args=("selected_case_for_args", case_id))
             
-            else:
-                # No cases found
-                st.info("📝 No cases found. Generate your first legal letter to get started!")
+            # Export every selected case's letter as one PDF
+            # Selections from every page, in listing order
+            selected_case_ids = [case['_id'] for case in sorted_cases if case.get('_id') in export_selection]
+            if selected_case_ids and st.button(f"💾 Export {len(selected_case_ids)} selected as one PDF", key="export_selected"):
+                export_cases_pdf(selected_case_ids)
+            
+            # Show selected case details if any button was clicked
+            if 'selected_case_for_view' in st.session_state:
+                st.markdown("---")
+                st.subheader("📄 Selected Case Letter")
+                legal_html = _render_legal_html(st.session_state.selected_case_for_view, 'formal_letter', 'Letter not available')
+                st.markdown(legal_html, unsafe_allow_html=True)
+                
+                st.button("❌ Close Letter View", on_click=_clear_selection, args=("selected_case_for_view",))
+            
+            if 'selected_case_for_args' in st.session_state:
+                st.markdown("---")
+                st.subheader("📊 Selected Case Arguments")
+                legal_html = _render_legal_html(st.session_state.selected_case_for_args, 'legal_arguments', 'Arguments not available')
+                st.markdown(legal_html, unsafe_allow_html=True)
                 
-                # Add a call-to-action button
-                if st.button("🚀 Generate Your First Legal Letter", type="primary"):
-                    st.session_state.current_page = "📝 Generate Letter"
-                    st.rerun()
+                st.button("❌ Close Arguments View", on_click=_clear_selection, args=("selected_case_for_args",))
         
         else:
-            st.error(f"❌ Could not load cases. API Status: {response.status_code}")
-            st.write("Please ensure the backend server is running properly.")
+            # No cases found
+            st.info("📝 No cases found. Generate your first legal letter to get started!")
             
+            # Add a call-to-action button
+            if st.button("🚀 Generate Your First Legal Letter", type="primary"):
+                st.session_state.current_page = "📝 Generate Letter"
+                st.rerun()
+
+    except requests.exceptions.HTTPError as e:
+        st.error(f"❌ Could not load cases. API Status: {e.response.status_code}")
+        st.write("Please ensure the backend server is running properly.")
     except requests.exceptions.Timeout:
         st.error("⏰ Request timed out. The backend server might be slow to respond.")
     except requests.exceptions.ConnectionError:
@@ -495,16 +626,32 @@ def render_generate_letter_page():
 def generate_letter_with_complete_data(case_data):
     """Generate legal letter with complete case data"""
     
+    # Re-submitting an identical form shows the earlier result instead of generating again.
+    # This also covers a second click mid-request: it stops this run only at the next
+    # Streamlit call, after the result below is already stored
+    case_key = hashlib.blake2b(orjson.dumps(case_data, option=orjson.OPT_SORT_KEYS)).hexdigest()
+    generated = st.session_state.setdefault('generated_results', {})
+    if case_key in generated:
+        st.session_state.generated_letter = generated[case_key]
+        st.session_state.current_case = case_data
+        st.info("ℹ️ This case was already generated; showing the existing letter.")
+        render_generated_letter(generated[case_key])
+        return
+    
     with st.spinner("🤖 AI is analyzing your case and generating legal letter..."):
         try:
             # Make API request
-            response = requests.post(f"{API_BASE_URL}/generate-letter", json=case_data, timeout=30)
+            response = SESSION.post(f"{API_BASE_URL}/generate-letter", json=case_data, timeout=30)
             
             if response.status_code == 200:
-                result = response.json()
+                result = _json(response)
+                generated[case_key] = result
                 st.session_state.generated_letter = result
                 st.session_state.current_case = case_data
                 
+                # Show the new case on the next cases listing
+                _api_cases.clear()
+                
                 st.success("✅ Legal letter generated successfully!")
                 
                 # Display results
@@ -532,13 +679,16 @@ def generate_letter(case_title, client_name, advocate_name, incident_summary, ta
             }
             
             # Make API request
-            response = requests.post(f"{API_BASE_URL}/generate-letter", json=payload, timeout=30)
+            response = SESSION.post(f"{API_BASE_URL}/generate-letter", json=payload, timeout=30)
             
             if response.status_code == 200:
-                result = response.json()
+                result = _json(response)
                 st.session_state.generated_letter = result
                 st.session_state.current_case = payload
                 
+                # Show the new case on the next cases listing
+                _api_cases.clear()
+                
                 st.success("✅ Legal letter generated successfully!")
                 
                 # Display results
@@ -565,7 +715,7 @@ def render_generated_letter(result):
     
     with tab1:
         st.subheader("Formal Legal Letter")
-        st.markdown(f'<div class="legal-text">{letter["formal_letter"]}</div>', unsafe_allow_html=True)
+        st.markdown(_LEGAL_TMPL.substitute(body=letter["formal_letter"]), unsafe_allow_html=True)
         
         # FIXED: Moved button outside form context
         if st.button("📋 Copy Letter to Clipboard", key="copy_letter"):
@@ -573,7 +723,7 @@ def render_generated_letter(result):
     
     with tab2:
         st.subheader("Legal Arguments & Strategy")
-        st.markdown(f'<div class="legal-text">{letter["legal_arguments"]}</div>', unsafe_allow_html=True)
+        st.markdown(_LEGAL_TMPL.substitute(body=letter["legal_arguments"]), unsafe_allow_html=True)
     
     with tab3:
         st.subheader("Supporting Legal Sections")
@@ -588,55 +738,82 @@ def render_generated_letter(result):
         with col1:
             # FIXED: Added unique keys to buttons
             if st.button("📄 Export as PDF", type="primary", key="export_pdf"):
-                export_case_pdf(result["case_id"], "legal")
+                export_case_pdf(result["case_id"], "legal", letter["case_title"], letter.get("created_at"))
         
         with col2:
             if st.button("💾 Save Case", key="save_case"):
                 st.success("Case already saved to database!")
                 st.info(f"Case ID: {result['case_id']}")
 
-def export_case_pdf(case_id, pdf_type):
-    """Export case as PDF"""
-    try:
-        response = requests.post(f"{API_BASE_URL}/export-pdf/{case_id}", timeout=10)
-        
-        if response.status_code == 200:
-            result = response.json()
-            case_title = result.get("case_title", f"case_{case_id}")
-
-            # Choose content based on type
-            if pdf_type.lower() == "legal":
-                html_content = result.get("formal_content", "<p>No formal content available.</p>")
-            else:
-                html_content = result.get("arguments", "<p>No arguments available.</p>")
-
-            # st.subheader("📄 PDF Preview")
-            # st.markdown(html_content, unsafe_allow_html=True)
-
-            # Generate PDF using pdfkit
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".pdf") as tmp_pdf:
-                pdf_path = tmp_pdf.name  # Save path before closing
-                pdfkit.from_string(html_content,tmp_pdf.name,configuration=config)
-
-            # Now the file is closed, safe to read
-            with open(pdf_path, "rb") as f:
-                pdf_data = f.read()
-
-            # Provide download
-            st.download_button(
-                label="📥 Download legal PDF" if pdf_type=="legal" else "📥 Download arguments PDF",
-                data=pdf_data,
-                file_name=f"{case_title.replace(' ', '_')}.pdf",
-                mime="application/pdf"
-            )
-
-            # Now it's safe to delete
-            os.unlink(pdf_path)
+def _fetch_export_html(case_id, document):
+    """Export HTML for one case document ("letter" or "arguments")"""
+    # The backend streams fresh exports; read them as chunks arrive
+    with SESSION.get(f"{API_BASE_URL}/export-pdf/{case_id}/{document}", stream=True, timeout=10) as response:
+        response.raise_for_status()
+        buffer = io.BytesIO()
+        for chunk in response.iter_content(chunk_size=EXPORT_CHUNK_SIZE):
+            buffer.write(chunk)
+        return buffer.getvalue().decode(response.encoding or "utf-8")
 
+def export_cases_pdf(case_ids):
+    """Export the letters of several cases as one PDF"""
+    try:
+        # Fetch every case's HTML concurrently
+        futures = [_submit(_fetch_export_html, case_id, "letter") for case_id in case_ids]
+        html_documents = [future.result() for future in futures]
+        
+        # One wkhtmltopdf run renders every document, each from a new page
+        pdf_data = _pdf_worker().convert(*html_documents)
+        if pdf_data is None:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                html_paths = []
+                for i, html_content in enumerate(html_documents):
+                    html_path = os.path.join(tmp_dir, f"case_{i}.html")
+                    with open(html_path, "w", encoding="utf-8") as f:
+                        f.write(html_content)
+                    html_paths.append(html_path)
+                pdf_data = pdfkit.from_file(html_paths, False, configuration=config, options=PDF_OPTS)
+        
+        st.download_button(
+            label=f"📥 Download {len(case_ids)} letters PDF",
+            data=pdf_data,
+            file_name="legal_letters.pdf",
+            mime="application/pdf"
+        )
+    
+    except Exception as e:
+        st.error(f"🚨 Export error: {str(e)}")
 
-        else:
-            st.error("❌ Failed to export PDF")
+@st.cache_data(ttl=3600, show_spinner=False, max_entries=64)
+def _render_pdf(case_id, pdf_type, updated_at):
+    """PDF bytes for a case document, cached per case revision"""
+    # Fetch only the HTML document that is being exported
+    document = "letter" if pdf_type.lower() == "legal" else "arguments"
+    html_content = _fetch_export_html(case_id, document)
+    
+    # Generate PDF with the persistent worker, falling back to a one-off pdfkit run
+    pdf_data = _pdf_worker().convert(html_content)
+    if pdf_data is None:
+        # Output path False returns the PDF bytes instead of writing a file
+        pdf_data = pdfkit.from_string(html_content, False, configuration=config, options=PDF_OPTS)
+    return pdf_data
 
+def export_case_pdf(case_id, pdf_type, case_title=None, updated_at=None):
+    """Export case as PDF"""
+    try:
+        case_title = case_title or f"case_{case_id}"
+        pdf_data = _render_pdf(case_id, pdf_type, updated_at)
+        
+        # Provide download
+        st.download_button(
+            label="📥 Download legal PDF" if pdf_type=="legal" else "📥 Download arguments PDF",
+            data=pdf_data,
+            file_name=f"{case_title.replace(' ', '_')}.pdf",
+            mime="application/pdf"
+        )
+    
+    except requests.exceptions.HTTPError:
+        st.error("❌ Failed to export PDF")
     except Exception as e:
         st.error(f"🚨 Export error: {str(e)}")
 
@@ -645,57 +822,54 @@ def render_cases_history_page():
     st.header("📋 Cases History")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/cases", timeout=10)
+        cases = _get_cases()
         
-        if response.status_code == 200:
-            cases = response.json().get("cases", [])
-            
-            if not cases:
-                st.info("No cases found. Generate your first legal letter!")
-                return
-            
-            # Search and filter
-            search_term = st.text_input("🔍 Search cases", placeholder="Search by case title or client name...")
-            
-            # Filter cases
-            if search_term:
-                filtered_cases = [
-                    case for case in cases 
-                    if search_term.lower() in case.get("case_title", "").lower() or 
-                       search_term.lower() in case.get("client_name", "").lower()
-                ]
-            else:
-                filtered_cases = cases
-            
-            # Display cases
-            for case in filtered_cases:
-                with st.expander(f"📁 {case.get('case_title', 'Untitled Case')} - {case.get('client_name', 'N/A')}"):
-                    
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        st.write(f"**Client:** {case.get('client_name', 'N/A')}")
-                        st.write(f"**Advocate:** {case.get('advocate_name', 'N/A')}")
-                    
-                    with col2:
-                        st.write(f"**Created:** {case.get('created_at', 'N/A')[:10]}")
-                        if case.get('tags'):
-                            st.write(f"**Tags:** {', '.join(case['tags'])}")
-                    
-                    with col3:
-                        # FIXED: Added unique keys to avoid duplicate button IDs
-                        if st.button(f"👁️ View Details", key=f"view_details_{case['_id']}"):
-                            st.session_state.selected_case = case
-                        if st.button(f"📄 Export Legal PDF", key=f"export_pdf_{case['_id']}"):
-                            export_case_pdf(case['_id'],pdf_type="legal")
-                        if st.button(f"📄 Export Argument PDF",key=f"exprt_argument_pdf_{case['_id']}"):
-                            export_case_pdf(case['_id'],pdf_type="argument")
-                    
-                    st.write(f"**Summary:** {case.get('incident_summary', 'N/A')[:200]}...")
+        if not cases:
+            st.info("No cases found. Generate your first legal letter!")
+            return
+        
+        # Search and filter
+        search_term = st.text_input("🔍 Search cases", placeholder="Search by case title or client name...")
         
+        # Filter cases
+        if search_term:
+            df = pd.DataFrame(cases).reindex(columns=["case_title", "client_name"])
+            mask = (
+                df["case_title"].str.contains(search_term, case=False, regex=False, na=False) |
+                df["client_name"].str.contains(search_term, case=False, regex=False, na=False)
+            )
+            filtered_cases = [cases[i] for i in mask[mask].index]
         else:
-            st.error("Failed to load cases history")
-            
+            filtered_cases = cases
+        
+        # Display cases
+        for case in filtered_cases:
+            with st.expander(f"📁 {case.get('case_title', 'Untitled Case')} - {case.get('client_name', 'N/A')}"):
+                
+                col1, col2, col3 = st.columns(3)
+                
+                with col1:
+                    st.write(f"**Client:** {case.get('client_name', 'N/A')}")
+                    st.write(f"**Advocate:** {case.get('advocate_name', 'N/A')}")
+                
+                with col2:
+                    st.write(f"**Created:** {case.get('created_at', 'N/A')[:10]}")
+                    if case.get('tags'):
+                        st.write(f"**Tags:** {', '.join(case['tags'])}")
+                
+                with col3:
+                    # FIXED: Added unique keys to avoid duplicate button IDs
+                    if st.button(f"👁️ View Details", key=f"view_details_{case['_id']}"):
+                        st.session_state.selected_case = case
+                    if st.button(f"📄 Export Legal PDF", key=f"export_pdf_{case['_id']}"):
+                        export_case_pdf(case['_id'], pdf_type="legal", case_title=case.get('case_title'), updated_at=case.get('updated_at') or case.get('created_at'))
+                    if st.button(f"📄 Export Argument PDF",key=f"exprt_argument_pdf_{case['_id']}"):
+                        export_case_pdf(case['_id'], pdf_type="argument", case_title=case.get('case_title'), updated_at=case.get('updated_at') or case.get('created_at'))
+                
+                st.write(f"**Summary:** {case.get('incident_summary', 'N/A')[:200]}...")
+
+    except requests.exceptions.HTTPError:
+        st.error("Failed to load cases history")
     except Exception as e:
         st.error(f"Error loading cases: {str(e)}")
 
@@ -704,57 +878,45 @@ def render_analytics_page():
     st.header("📊 Analytics Dashboard")
     
     try:
-        response = requests.get(f"{API_BASE_URL}/cases", timeout=10)
+        cases = _get_cases()
         
-        if response.status_code == 200:
-            cases = response.json().get("cases", [])
-            
-            if not cases:
-                st.info("No data available for analytics.")
-                return
-            
-            # Create DataFrame
-            df = pd.DataFrame(cases)
-            
-            col1, col2, col3 = st.columns(3)
-            
-            with col1:
-                st.metric("Total Cases", len(cases))
-            
-            with col2:
-                unique_clients = df['client_name'].nunique() if 'client_name' in df.columns else 0
-                st.metric("Unique Clients", unique_clients)
-            
-            with col3:
-                # FIXED: Updated year filter to 2025
-                recent_cases = len([c for c in cases if c.get('created_at', '').startswith('2025')])
-                st.metric("Cases This Year", recent_cases)
-            
-            # Tags analysis
-            if 'tags' in df.columns:
-                st.subheader("📈 Case Types Distribution")
-                all_tags = []
-                for tags in df['tags']:
-                    if isinstance(tags, list):
-                        all_tags.extend(tags)
-                
-                if all_tags:
-                    tag_counts = pd.Series(all_tags).value_counts()
-                    st.bar_chart(tag_counts)
-            
-            # Recent activity
-            st.subheader("📅 Recent Activity")
-            if 'created_at' in df.columns:
-                try:
-                    df['date'] = pd.to_datetime(df['created_at']).dt.date
-                    daily_counts = df['date'].value_counts().sort_index()
-                    st.line_chart(daily_counts)
-                except:
-                    st.info("No valid date data available for activity chart.")
+        if not cases:
+            st.info("No data available for analytics.")
+            return
+        
+        # Only the columns the charts use; missing keys become empty cells
+        df = pd.DataFrame.from_records(cases, columns=ANALYTICS_COLUMNS)
+        df['created_at'] = df['created_at'].astype("string")
+        
+        col1, col2, col3 = st.columns(3)
         
+        with col1:
+            st.metric("Total Cases", len(df))
+        
+        with col2:
+            st.metric("Unique Clients", df['client_name'].nunique())
+        
+        with col3:
+            recent_cases = int(df['created_at'].str.startswith(str(datetime.utcnow().year)).sum())
+            st.metric("Cases This Year", recent_cases)
+        
+        # Tags analysis
+        st.subheader("📈 Case Types Distribution")
+        tag_counts = df['tags'].explode().value_counts()
+        
+        if not tag_counts.empty:
+            st.bar_chart(tag_counts)
+        
+        # Recent activity
+        st.subheader("📅 Recent Activity")
+        daily_counts = pd.to_datetime(df['created_at'], format="ISO8601", errors="coerce").dt.date.value_counts().sort_index()
+        if not daily_counts.empty:
+            st.line_chart(daily_counts)
         else:
-            st.error("Failed to load analytics data")
-            
+            st.info("No valid date data available for activity chart.")
+
+    except requests.exceptions.HTTPError:
+        st.error("Failed to load analytics data")
     except Exception as e:
         st.error(f"Error loading analytics: {str(e)}")
 